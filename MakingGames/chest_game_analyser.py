@@ -0,0 +1,158 @@
+# /// script
+# requires-python = ">=3.12"
+# dependencies = [
+#     "numpy",
+#     "pygame",
+# ]
+# ///
+
+"""Generate chest game levels for a range of seeds and measure them.
+
+Levels are built headless across a process pool, exactly as Game(seed=...)
+builds them, and one row of metrics per level is written to a .npz or .csv
+file, a chunk of seeds at a time.
+"""
+
+import argparse
+import csv
+import os
+import time
+from contextlib import nullcontext
+from functools import partial
+from multiprocessing import Pool
+
+import numpy as np
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import chest_game_claude37 as chest_game
+
+# One column per metric; distances are in tiles and -1 when there is nothing
+# to measure
+COLUMNS = (
+    "seed",
+    "open_cells",
+    "dead_ends",  # open cells with a single open neighbor
+    "chests",
+    "unreachable_chests",  # chests the player can't walk to without breaking walls
+    "chest_distance_min",
+    "chest_distance_mean",
+    "chest_distance_max",
+    "monster_distance_min",  # graph distance from the player to the nearest monster
+    "route_length",  # shortest walk through every reachable chest, with --route
+)
+
+
+def analyse_level(game, route=False):
+    """Metrics of a freshly generated level, in COLUMNS order"""
+    grid = game.grid
+    cells = np.frombuffer(grid.cells, dtype=np.uint8).reshape(grid.height, grid.width)
+    open_tiles = cells == 0
+
+    # Open neighbors of every tile, counting outside the maze as wall
+    padded = np.pad(open_tiles, 1).astype(np.int8)
+    neighbors = padded[:-2, 1:-1] + padded[2:, 1:-1] + padded[1:-1, :-2] + padded[1:-1, 2:]
+    dead_ends = int(np.count_nonzero(open_tiles & (neighbors == 1)))
+
+    field = chest_game.DistanceField(grid)
+    start = game.player.tile()
+    field.update(*start)
+    distance = np.frombuffer(field.distance, dtype=np.int32)
+
+    chest_tiles = [grid.index(chest.rect.centerx // chest_game.TILE_SIZE,
+                              chest.rect.centery // chest_game.TILE_SIZE) for chest in game.chests]
+    chest_distance = distance[chest_tiles] if chest_tiles else np.zeros(0, dtype=np.int32)
+    reachable = chest_distance[chest_distance >= 0]
+
+    monsters = [monster.center_tile(grid) for monster in game.monsters]
+    if game.swarm is not None:
+        monsters += [grid.index(int((x + game.swarm.width / 2) // chest_game.TILE_SIZE),
+                                int((y + game.swarm.height / 2) // chest_game.TILE_SIZE))
+                     for x, y in zip(game.swarm.x.tolist(), game.swarm.y.tolist())]
+    monster_distance = distance[monsters] if monsters else np.zeros(0, dtype=np.int32)
+    monster_distance = monster_distance[monster_distance >= 0]
+
+    route_length = -1
+    if route:
+        _, route_length = chest_game.solve_route(grid, grid.index(*start), chest_tiles)
+
+    return (
+        game.seed,
+        int(np.count_nonzero(open_tiles)),
+        dead_ends,
+        len(chest_tiles),
+        len(chest_tiles) - len(reachable),
+        int(reachable.min()) if len(reachable) else -1,
+        float(reachable.mean()) if len(reachable) else -1.0,
+        int(reachable.max()) if len(reachable) else -1,
+        int(monster_distance.min()) if len(monster_distance) else -1,
+        route_length,
+    )
+
+
+def analyse_seeds(seeds, route=False, **game_options):
+    """Build and measure the level of every seed; returns one array per column"""
+    rows = []
+    for seed in seeds:
+        game = chest_game.Game(seed=seed, **game_options)
+        game.close()
+        rows.append(analyse_level(game, route))
+    columns = list(zip(*rows)) if rows else [()] * len(COLUMNS)
+    return {name: np.array(values, dtype=np.float64 if name == "chest_distance_mean" else np.int64)
+            for name, values in zip(COLUMNS, columns)}
+
+
+def run_analysis(first_seed, last_seed, out, workers=None, chunk_size=1000, route=False, **game_options):
+    """Measure the levels of seeds first_seed..last_seed - 1 into out (.npz or .csv).
+
+    Seeds are handed to the pool in chunks; a CSV gets each chunk appended
+    as soon as it is done, a .npz is written once at the end. Returns a
+    dict of summary stats.
+    """
+    chunks = [range(start, min(start + chunk_size, last_seed))
+              for start in range(first_seed, last_seed, chunk_size)]
+    work = partial(analyse_seeds, route=route, **game_options)
+    collected = {name: [] for name in COLUMNS}
+    start = time.perf_counter()
+    with Pool(workers) as pool, open(out, "w", newline="") if out.endswith(".csv") else nullcontext() as f:
+        writer = None
+        if f is not None:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+        for columns in pool.imap(work, chunks):
+            if writer is not None:
+                writer.writerows(zip(*(columns[name].tolist() for name in COLUMNS)))
+            for name in COLUMNS:
+                collected[name].append(columns[name])
+    elapsed = time.perf_counter() - start
+
+    columns = {name: np.concatenate(parts) if parts else np.zeros(0) for name, parts in collected.items()}
+    if not out.endswith(".csv"):
+        np.savez_compressed(out, **columns)
+
+    levels = len(columns["seed"])
+    return {
+        "levels": levels,
+        "seconds": elapsed,
+        "levels_per_second": levels / elapsed if elapsed else float("inf"),
+        "levels_with_unreachable_chests": int(np.count_nonzero(columns["unreachable_chests"])),
+        "mean_dead_ends": float(columns["dead_ends"].mean()) if levels else 0.0,
+        "mean_chest_distance": float(columns["chest_distance_mean"].mean()) if levels else 0.0,
+        "min_monster_distance": int(columns["monster_distance_min"].min()) if levels else -1,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure chest game levels over a range of seeds")
+    parser.add_argument("--seeds", type=int, nargs=2, default=(0, 10000), metavar=("FIRST", "END"),
+                        help="analyse seeds FIRST up to but not including END")
+    parser.add_argument("--out", default="levels.npz", metavar="FILE", help="output .npz or .csv file")
+    parser.add_argument("--workers", type=int, metavar="N", help="worker processes (default: one per core)")
+    parser.add_argument("--chunk-size", type=int, default=1000, metavar="N", help="seeds per task")
+    parser.add_argument("--route", action="store_true",
+                        help="also solve the shortest route through every chest (slower)")
+    parser.add_argument("--monsters", type=int, default=1, metavar="N")
+    parser.add_argument("--swarm", action="store_true")
+    parser.add_argument("--world-size", type=int, nargs=2, metavar=("W", "H"))
+    args = parser.parse_args()
+    print(run_analysis(args.seeds[0], args.seeds[1], args.out, args.workers, args.chunk_size, args.route,
+                       monster_count=args.monsters, swarm=args.swarm, world_size=args.world_size))
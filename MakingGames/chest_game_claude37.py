@@ -1,17 +1,31 @@
 # /// script
 # requires-python = ">=3.12"
 # dependencies = [
+#     "numpy",
 #     "pygame",
 # ]
 # ///
 
+import argparse
+import csv
+import gc
+import heapq
+import json
+import math
+import mmap
+import numpy as np
+import os
 import pygame
+import queue
 import random
+import struct
 import sys
-from collections import deque
-
-# Initialize pygame
-pygame.init()
+import threading
+import time
+import weakref
+from array import array
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 
 # Constants
 SCREEN_WIDTH = 800
@@ -20,6 +34,31 @@ TILE_SIZE = 40
 PLAYER_SIZE = 30
 CHEST_SIZE = 30
 PLAYER_SPEED = 5
+# Default cap on rendered frames per second; 0 renders as fast as possible
+FPS = 60
+
+# The simulation advances in fixed ticks of TICK seconds whatever the render
+# rate; speeds are in pixels per tick
+TICK_RATE = 60
+TICK = 1 / TICK_RATE
+# Most real time simulated for one rendered frame; past this a slow machine
+# plays in slow motion instead of falling further and further behind
+MAX_FRAME_TIME = 0.25
+
+# Timers, in seconds
+WALL_BREAK_COOLDOWN = 0.75
+PATH_UPDATE_INTERVAL = 0.5  # between a BFS monster's searches
+BREAK_EFFECT_DURATION = 0.25
+# Chests placed per screenful of maze
+CHESTS_PER_SCREEN = 10
+# Mazes with more tiles than this use the faster sidewinder generator
+LARGE_MAZE_TILES = 250_000
+
+# Endless mode: the world is made of square chunks of tiles, and the game
+# runs on a window of WINDOW_CHUNKS x WINDOW_CHUNKS chunks around the player
+CHUNK_SIZE = 16
+CHESTS_PER_CHUNK = 2
+WINDOW_CHUNKS = 3
 
 # Colors
 BLACK = (0, 0, 0)
@@ -31,217 +70,940 @@ GOLD = (255, 215, 0)
 BLUE = (0, 0, 255)
 RED = (255, 0, 0)
 
-# Set up the display
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Maze Treasure Hunter")
-clock = pygame.time.Clock()
+# Particle pool shared by all visual effects; when it is full the oldest
+# particles are recycled
+MAX_PARTICLES = 1024
+BREAK_PARTICLES = 24  # per broken wall
+
+# Monster pathfinding modes
+PATHFINDING_BFS = "bfs"  # each monster searches again every PATH_UPDATE_INTERVAL seconds
+PATHFINDING_FIELD = "field"  # all monsters share one distance field to the player
+PATHFINDING_DSTAR = "dstar"  # each monster keeps an incremental D* Lite search
+PATHFINDING_BITBOARD = "bitboard"  # like bfs, but searching a whole frontier at a time on a Bitboard
+
+# Simulation events reported by Game.step()
+EVENT_CHEST_OPENED = "chest_opened"
+EVENT_WALL_BROKEN = "wall_broken"
+EVENT_CAUGHT = "caught"
+EVENT_WON = "won"
+EVENT_WORLD_SHIFTED = "world_shifted"  # endless mode moved its window; value is the pixel shift
+
+# Frame phases timed by the profiler, in the order they happen
+PHASE_EVENTS = "events"
+PHASE_PLAYER = "player"
+PHASE_PATHFINDING = "pathfinding"
+PHASE_MONSTERS = "monsters"
+PHASE_CHESTS = "chests"
+PHASE_DRAW = "draw"
+PHASE_HUD = "hud"
+PHASE_FLIP = "flip"
+PHASE_WAIT = "wait"  # clock.tick() sleeping off the rest of the frame
+PHASES = (PHASE_EVENTS, PHASE_PLAYER, PHASE_PATHFINDING, PHASE_MONSTERS, PHASE_CHESTS,
+          PHASE_DRAW, PHASE_HUD, PHASE_FLIP, PHASE_WAIT)
+
+# Hot operations counted by the profiler each frame
+COUNT_COLLISIONS = "collisions"  # rect-vs-wall and rect-vs-rect tests
+COUNT_BFS_NODES = "bfs_nodes"  # tiles expanded by any path search
+COUNT_DRAW_CALLS = "draw_calls"  # draw primitives and blits
+COUNTERS = (COUNT_COLLISIONS, COUNT_BFS_NODES, COUNT_DRAW_CALLS)
+
+
+def _ignore(*args):
+    pass
+
+
+class FrameProfiler:
+    """Optional per-frame timings and operation counts for main().
+
+    mark(phase) charges the time since the previous mark to that phase, so
+    phases that interleave (every monster plans, then moves) add up without
+    any nesting. Until enable() is called, mark() and count() are no-ops
+    that cost one function call. Only the thread that called enable() is
+    measured, so levels built in the background don't count towards the
+    frame being drawn.
+    """
+    def __init__(self, window=120):
+        self.enabled = False
+        self.show_overlay = False
+        self.columns = [f"{phase}_ms" for phase in PHASES] + list(COUNTERS)
+        self.frames = []
+        self.recent = deque(maxlen=window)
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.last_mark = 0.0
+        self.thread = None
+        self.font = None
+        self.overlay = None
+        self.mark = self.count = _ignore
+
+    def enable(self):
+        self.enabled = True
+        self.thread = threading.get_ident()
+        self.last_mark = time.perf_counter()
+        self.mark = self._mark
+        self.count = self._count
+
+    def _mark(self, phase):
+        if threading.get_ident() != self.thread:
+            return
+        now = time.perf_counter()
+        self.times[phase] += now - self.last_mark
+        self.last_mark = now
+
+    def _count(self, counter, amount=1):
+        if threading.get_ident() == self.thread:
+            self.counts[counter] += amount
+
+    def end_frame(self):
+        """Store the finished frame's numbers and start a new frame"""
+        if not self.enabled:
+            return
+        frame = ([self.times[phase] * 1000 for phase in PHASES] +
+                 [self.counts[counter] for counter in COUNTERS])
+        self.frames.append(frame)
+        self.recent.append(frame)
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        # The overlay text is only re-rendered a few times a second
+        if len(self.frames) % 15 == 0:
+            self.overlay = None
+
+    def percentiles(self, frames):
+        """p50 and p99 of every column over some frames"""
+        values = np.array(frames, dtype=np.float64).reshape(-1, len(self.columns))
+        if not len(values):
+            return np.zeros(len(self.columns)), np.zeros(len(self.columns))
+        return np.percentile(values, 50, axis=0), np.percentile(values, 99, axis=0)
+
+    def draw_overlay(self, screen):
+        """Draw rolling p50/p99 of the recent frames; returns the area covered"""
+        if self.overlay is None:
+            if self.font is None:
+                self.font = pygame.font.SysFont('Arial', 14)
+            p50, p99 = self.percentiles(list(self.recent))
+            lines = [f"{'':12}{'p50':>8}{'p99':>8}"]
+            lines += [f"{name:12}{low:8.2f}{high:8.2f}"
+                      for name, low, high in zip(PHASES, p50, p99)]
+            lines += [f"{name:12}{low:8.0f}{high:8.0f}"
+                      for name, low, high in zip(COUNTERS, p50[len(PHASES):], p99[len(PHASES):])]
+            rendered = [self.font.render(line, True, WHITE) for line in lines]
+            line_height = self.font.get_linesize()
+            self.overlay = pygame.Surface((max(text.get_width() for text in rendered) + 10,
+                                           line_height * len(rendered) + 10))
+            self.overlay.set_alpha(200)
+            for i, text in enumerate(rendered):
+                self.overlay.blit(text, (5, 5 + i * line_height))
+        self.count(COUNT_DRAW_CALLS)
+        return screen.blit(self.overlay, (screen.get_width() - self.overlay.get_width() - 10, 10))
+
+    def export(self, path):
+        """Write every recorded frame to a .json or .csv file"""
+        if path.endswith(".json"):
+            p50, p99 = self.percentiles(self.frames)
+            with open(path, "w") as f:
+                json.dump({"columns": self.columns,
+                           "summary": {column: {"p50": low, "p99": high}
+                                       for column, low, high in zip(self.columns, p50.tolist(), p99.tolist())},
+                           "frames": self.frames}, f)
+        else:
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["frame"] + self.columns)
+                for number, frame in enumerate(self.frames):
+                    writer.writerow([number] + frame)
+
+
+# Shared by every instrumented call site; main() enables it on request
+profiler = FrameProfiler()
+
+class TileGrid:
+    """Persistent passability grid for a level.
+
+    Cells are stored flat in a bytearray indexed by y*width+x (1 = wall,
+    0 = open). This is the only record of the walls; there is no object per
+    wall tile. The BFS parent, queue and visited buffers are allocated once
+    here and reused by every search, so pathfinding never allocates.
+
+    It also serves as the collision service: walls are tile-aligned, so a
+    rect only needs checking against the tiles it overlaps.
+    """
+    def __init__(self, maze):
+        maze = np.asarray(maze, dtype=np.uint8)
+        self.height, self.width = maze.shape
+        size = self.width * self.height
+        self.cells = bytearray(maze.tobytes())
+
+        # Preallocated BFS buffers
+        self.parent = array('i', bytes(4 * size))
+        self.queue = array('i', bytes(4 * size))
+        # A cell counts as visited when its stamp equals the current search
+        # number, so the buffers never need clearing between searches
+        self.visited = array('I', bytes(4 * size))
+        self.search_id = 0
+        # Every tile whose wall was added or removed, in order
+        self.changed_tiles = []
+
+    @property
+    def version(self):
+        """Changes whenever a wall is added or removed"""
+        return len(self.changed_tiles)
+
+    def index(self, x, y):
+        return y * self.width + x
+
+    def is_wall(self, x, y):
+        """Check a tile; anything outside the grid counts as wall"""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.cells[y * self.width + x] == 1
+        return True
+
+    def remove_wall(self, index):
+        """Open up a tile"""
+        self.cells[index] = 0
+        self.changed_tiles.append(index)
+
+    def collides(self, left, top, width, height):
+        """Check whether a rect overlaps any wall tile.
+
+        A rect no bigger than a tile overlaps at most four tiles, so this
+        costs the same however many walls the maze has.
+        """
+        profiler.count(COUNT_COLLISIONS)
+        x0, y0 = left // TILE_SIZE, top // TILE_SIZE
+        x1, y1 = (left + width - 1) // TILE_SIZE, (top + height - 1) // TILE_SIZE
+        if x0 < 0 or y0 < 0 or x1 >= self.width or y1 >= self.height:
+            return True
+        cells, grid_width = self.cells, self.width
+        for y in range(y0 * grid_width, (y1 + 1) * grid_width, grid_width):
+            for index in range(y + x0, y + x1 + 1):
+                if cells[index]:
+                    return True
+        return False
+
+    def nearest_wall(self, rect, point):
+        """Index of the wall tile overlapping rect whose center is closest to point"""
+        x0, y0 = max(rect.left // TILE_SIZE, 0), max(rect.top // TILE_SIZE, 0)
+        x1 = min((rect.right - 1) // TILE_SIZE, self.width - 1)
+        y1 = min((rect.bottom - 1) // TILE_SIZE, self.height - 1)
+        px, py = point
+        half = TILE_SIZE / 2
+        best, best_distance = None, None
+        for y in range(y0, y1 + 1):
+            for x in range(x0, x1 + 1):
+                index = y * self.width + x
+                if self.cells[index]:
+                    # Squared distance is enough for comparing
+                    distance = ((x * TILE_SIZE + half - px) ** 2 +
+                                (y * TILE_SIZE + half - py) ** 2)
+                    if best is None or distance < best_distance:
+                        best, best_distance = index, distance
+        return best
+
+    def neighbors(self, index):
+        """Open tiles next to a tile"""
+        width, cells = self.width, self.cells
+        x = index % width
+        result = []
+        for neighbor in (index + 1 if x < width - 1 else -1,
+                         index + width,
+                         index - 1 if x > 0 else -1,
+                         index - width):
+            if 0 <= neighbor < len(cells) and cells[neighbor] == 0:
+                result.append(neighbor)
+        return result
+
+    def tile_center(self, index):
+        """Pixel coordinates of the center of a tile"""
+        y, x = divmod(index, self.width)
+        return (x * TILE_SIZE + TILE_SIZE // 2, y * TILE_SIZE + TILE_SIZE // 2)
+
+    def find_path(self, start_x, start_y, target_x, target_y):
+        """Breadth-first search between two tiles.
+
+        Returns the tile indices of the path from start (exclusive) to target
+        (inclusive) in reverse order, so the next step is path[-1].
+        """
+        width, height = self.width, self.height
+        if not (0 <= start_x < width and 0 <= start_y < height and
+                0 <= target_x < width and 0 <= target_y < height):
+            return []
+
+        cells, parent, queue, visited = self.cells, self.parent, self.queue, self.visited
+        self.search_id += 1
+        stamp = self.search_id
+
+        start = start_y * width + start_x
+        target = target_y * width + target_x
+        visited[start] = stamp
+        queue[0] = start
+        head, tail = 0, 1
+        last_column = width - 1
+        size = width * height
+
+        # BFS until we find the target or exhaust all options
+        found = start == target
+        while head < tail and not found:
+            current = queue[head]
+            head += 1
+            x = current % width
+
+            # Neighbors: right, down, left, up
+            for neighbor in (current + 1 if x < last_column else -1,
+                             current + width,
+                             current - 1 if x > 0 else -1,
+                             current - width):
+                if (0 <= neighbor < size and cells[neighbor] == 0 and
+                        visited[neighbor] != stamp):
+                    visited[neighbor] = stamp
+                    parent[neighbor] = current
+                    if neighbor == target:
+                        found = True
+                        break
+                    queue[tail] = neighbor
+                    tail += 1
+
+        profiler.count(COUNT_BFS_NODES, head)
+
+        # Walk back from the target to reconstruct the path
+        path = []
+        if found:
+            current = target
+            while current != start:
+                path.append(current)
+                current = parent[current]
+        return path
+
+
+class DistanceField:
+    """Breadth-first distances from one source tile to every reachable tile.
+
+    Shared by all monsters chasing the player: it is recomputed only when the
+    player enters a new tile or the maze changes, and each monster then finds
+    its next step by looking at four neighbors.
+    """
+    def __init__(self, grid):
+        self.grid = grid
+        size = grid.width * grid.height
+        self.distance = array('i', [-1]) * size
+        self.unreached = array('i', [-1]) * size
+        self.queue = array('i', bytes(4 * size))
+        self.source = None
+        self.grid_version = None
+
+    def update(self, x, y):
+        """Make the field point at tile (x, y); returns True if it was recomputed"""
+        grid = self.grid
+        source = grid.index(x, y)
+        if source == self.source and grid.version == self.grid_version:
+            return False
+        self.source = source
+        self.grid_version = grid.version
+
+        width, size = grid.width, grid.width * grid.height
+        cells, distance, queue = grid.cells, self.distance, self.queue
+        distance[:] = self.unreached
+        if not 0 <= source < size or cells[source]:
+            return True
+
+        distance[source] = 0
+        queue[0] = source
+        head, tail = 0, 1
+        last_column = width - 1
+        while head < tail:
+            current = queue[head]
+            head += 1
+            x = current % width
+            step = distance[current] + 1
+            for neighbor in (current + 1 if x < last_column else -1,
+                             current + width,
+                             current - 1 if x > 0 else -1,
+                             current - width):
+                if 0 <= neighbor < size and cells[neighbor] == 0 and distance[neighbor] < 0:
+                    distance[neighbor] = step
+                    queue[tail] = neighbor
+                    tail += 1
+        profiler.count(COUNT_BFS_NODES, head)
+        return True
+
+    def next_tile(self, index):
+        """Neighbor of a tile that is one step closer to the source, or None"""
+        distance = self.distance
+        current = distance[index]
+        if current <= 0:
+            return None
+        width = self.grid.width
+        x = index % width
+        for neighbor in (index + 1 if x < width - 1 else -1,
+                         index + width,
+                         index - 1 if x > 0 else -1,
+                         index - width):
+            if 0 <= neighbor < len(distance) and distance[neighbor] == current - 1:
+                return neighbor
+        return None
+
+
+class Bitboard:
+    """The open tiles of a TileGrid as one Python big-int bitset.
+
+    Tile (x, y) is bit y*stride + x with stride = width + 1, so every row
+    ends in a padding bit that is never open: shifting a set of tiles one
+    bit left or right can't wrap into the next row once it is masked with
+    the open tiles. A whole BFS frontier then grows by one step with four
+    shifts and a mask, however many tiles it holds. Walls broken in the
+    grid are picked up before each search.
+    """
+    def __init__(self, grid):
+        self.grid = grid
+        self.stride = grid.width + 1
+        cells = np.frombuffer(grid.cells, dtype=np.uint8).reshape(grid.height, grid.width)
+        padded = np.zeros((grid.height, self.stride), dtype=bool)
+        padded[:, :-1] = cells == 0
+        self.open = int.from_bytes(np.packbits(padded, bitorder="little").tobytes(), "little")
+        self.changes_seen = len(grid.changed_tiles)
+
+    def bit(self, index):
+        """Bit number of a tile index"""
+        y, x = divmod(index, self.grid.width)
+        return y * self.stride + x
+
+    def tile(self, bit):
+        """Tile index of a bit number"""
+        y, x = divmod(bit, self.stride)
+        return y * self.grid.width + x
+
+    def contains(self, tiles, index):
+        """Check whether a set of tiles holds a tile index"""
+        return tiles >> self.bit(index) & 1 == 1
+
+    def sync(self):
+        """Catch up with walls added or removed in the grid since the last call"""
+        grid = self.grid
+        for index in grid.changed_tiles[self.changes_seen:]:
+            if grid.cells[index]:
+                self.open &= ~(1 << self.bit(index))
+            else:
+                self.open |= 1 << self.bit(index)
+        self.changes_seen = len(grid.changed_tiles)
+
+    def expand(self, tiles):
+        """Open tiles next to any tile of a set"""
+        stride = self.stride
+        return (tiles << 1 | tiles >> 1 | tiles << stride | tiles >> stride) & self.open
+
+    def layers(self, x, y, target=None):
+        """BFS distance layers from tile (x, y): layers[d] holds the tiles d steps away.
+
+        Stops at the layer holding the target tile index, if one is given.
+        """
+        self.sync()
+        frontier = 1 << self.bit(self.grid.index(x, y))
+        stop = 0 if target is None else 1 << self.bit(target)
+        layers, previous = [], 0
+        while frontier:
+            layers.append(frontier)
+            if frontier & stop:
+                break
+            # A tile's neighbors are at most one layer away from it, so only
+            # the last two layers need leaving out
+            frontier, previous = self.expand(frontier) & ~(previous | frontier), frontier
+        return layers
+
+    def flood_fill(self, x, y):
+        """Set of every tile reachable from tile (x, y), including itself"""
+        self.sync()
+        open_tiles = self.open
+        reached = 1 << self.bit(self.grid.index(x, y))
+        while True:
+            grown = reached | self.expand(reached)
+            # Adding the set to the open tiles carries each of its tiles up
+            # through the run of open tiles to its right, so a corridor
+            # running that way fills in one step
+            grown |= ((open_tiles + grown) ^ open_tiles ^ grown) & open_tiles
+            if grown == reached:
+                return reached
+            reached = grown
+
+    def find_path(self, start_x, start_y, target_x, target_y):
+        """Breadth-first search between two tiles, a whole layer at a time.
+
+        Returns the same as TileGrid.find_path: tile indices from start
+        (exclusive) to target (inclusive), next step last. Among equally
+        short paths it may pick a different one.
+        """
+        grid = self.grid
+        if not (0 <= start_x < grid.width and 0 <= start_y < grid.height and
+                0 <= target_x < grid.width and 0 <= target_y < grid.height):
+            return []
+        target = grid.index(target_x, target_y)
+        layers = self.layers(start_x, start_y, target)
+        current = self.bit(target)
+        if not layers[-1] >> current & 1:
+            return []
+
+        # Walk back from the target through a neighbor in each earlier layer
+        stride = self.stride
+        path = []
+        for layer in reversed(layers[:-1]):
+            path.append(self.tile(current))
+            for neighbor in (current + 1, current + stride, current - 1, current - stride):
+                if neighbor >= 0 and layer >> neighbor & 1:
+                    current = neighbor
+                    break
+        return path
+
+
+def count_down(timer, dt):
+    """A timer in seconds after dt more seconds, stopping at zero.
+
+    Leftovers from float rounding count as zero, so a timer of n ticks
+    always runs out on the nth tick.
+    """
+    timer -= dt
+    return timer if timer > 1e-9 else 0.0
+
+
+# Cost standing in for "unreachable" in the incremental planner
+INFINITY = 1 << 30
+
+
+class DStarLite:
+    """Incremental shortest-path planner from a monster to the player.
+
+    Moving Target D* Lite: the search is rooted at a tile the monster stood
+    on and keeps its g/rhs values, search tree and open list between calls.
+    When the player steps to another tile, only the key modifier changes and
+    the search carries on from where it stopped. While the monster walks
+    along the tree's path to the player, that path is still a shortest one
+    and the root stays put; once it leaves the path, the part of the tree
+    that doesn't hang below its tile is cleared in one pass instead of being
+    repaired tile by tile. A broken wall only repairs the tiles whose
+    distance actually changes.
+    """
+    def __init__(self, grid):
+        self.grid = grid
+        size = grid.width * grid.height
+        self.g = array('i', [INFINITY]) * size
+        self.rhs = array('i', [INFINITY]) * size
+        # Previous tile on the best known path from the root, or -1
+        self.parent = array('i', [-1]) * size
+        self.open_list = []
+        # Current key of every tile on the open list; heap entries that don't
+        # match are stale and skipped
+        self.open_keys = {}
+        self.key_modifier = 0
+        self.root = None
+        self.start = None
+        self.goal = None
+        self.changes_seen = len(grid.changed_tiles)
+        self.expanded = 0
+        # Tile after each tile on the path to the player, kept until the
+        # search changes
+        self.path_steps = {}
+        self.path_version = None
+
+    def heuristic(self, a, b):
+        ay, ax = divmod(a, self.grid.width)
+        by, bx = divmod(b, self.grid.width)
+        return abs(ax - bx) + abs(ay - by)
+
+    def key(self, tile):
+        best = min(self.g[tile], self.rhs[tile])
+        return (best + self.heuristic(tile, self.goal) + self.key_modifier, best)
+
+    def queue_tile(self, tile):
+        """Put a tile on the open list if it is inconsistent, or take it off"""
+        self.open_keys.pop(tile, None)
+        if self.g[tile] != self.rhs[tile]:
+            key = self.key(tile)
+            self.open_keys[tile] = key
+            heapq.heappush(self.open_list, (key, tile))
+
+    def update_tile(self, tile):
+        """Recompute a tile's rhs and parent from its neighbors"""
+        if tile != self.root:
+            best, parent = INFINITY, -1
+            if not self.grid.cells[tile]:
+                g = self.g
+                for neighbor in self.grid.neighbors(tile):
+                    if g[neighbor] + 1 < best:
+                        best, parent = g[neighbor] + 1, neighbor
+            self.rhs[tile] = best
+            self.parent[tile] = parent
+        self.queue_tile(tile)
+
+    def compute_shortest_path(self):
+        g, rhs, parent = self.g, self.rhs, self.parent
+        open_list, open_keys = self.open_list, self.open_keys
+        goal = self.goal
+        expanded = self.expanded
+        while open_list:
+            key, tile = open_list[0]
+            if open_keys.get(tile) != key:
+                heapq.heappop(open_list)
+                continue
+            if key >= self.key(goal) and rhs[goal] <= g[goal]:
+                break
+
+            heapq.heappop(open_list)
+            del open_keys[tile]
+            self.expanded += 1
+            new_key = self.key(tile)
+            if key < new_key:
+                open_keys[tile] = new_key
+                heapq.heappush(open_list, (new_key, tile))
+            elif g[tile] > rhs[tile]:
+                g[tile] = cost = rhs[tile]
+                for neighbor in self.grid.neighbors(tile):
+                    if neighbor != self.root and rhs[neighbor] > cost + 1:
+                        rhs[neighbor] = cost + 1
+                        parent[neighbor] = tile
+                        self.queue_tile(neighbor)
+            else:
+                g[tile] = INFINITY
+                self.update_tile(tile)
+                for neighbor in self.grid.neighbors(tile):
+                    if parent[neighbor] == tile:
+                        self.update_tile(neighbor)
+        profiler.count(COUNT_BFS_NODES, self.expanded - expanded)
+
+    def move_root(self, tile):
+        """Re-root the search tree at the monster's tile.
+
+        Tiles outside the subtree below the new root lose their costs in one
+        sweep; the ones next to the subtree go back on the open list.
+        """
+        g, rhs, parent = self.g, self.rhs, self.parent
+        old_root, self.root = self.root, tile
+        if rhs[tile] >= INFINITY:
+            # The monster left the search tree: start over
+            self.reset(tile)
+            return
+
+        # Everything hanging below the old root, except the new one's subtree
+        parent[tile] = -1
+        deleted = []
+        stack = [old_root]
+        while stack:
+            tile = stack.pop()
+            deleted.append(tile)
+            for neighbor in self.grid.neighbors(tile):
+                if parent[neighbor] == tile:
+                    stack.append(neighbor)
+        for tile in deleted:
+            g[tile] = rhs[tile] = INFINITY
+            parent[tile] = -1
+            self.open_keys.pop(tile, None)
+        for tile in deleted:
+            self.update_tile(tile)
+
+    def reset(self, root):
+        """Forget the search and start a new one from root"""
+        size = len(self.g)
+        self.g = array('i', [INFINITY]) * size
+        self.rhs = array('i', [INFINITY]) * size
+        self.parent = array('i', [-1]) * size
+        self.open_list = []
+        self.open_keys = {}
+        self.key_modifier = 0
+        self.root = root
+        self.rhs[root] = 0
+        self.queue_tile(root)
+
+    def plan(self, start, goal):
+        """Bring the search up to date for the monster's and player's tiles"""
+        grid = self.grid
+        self.start = start
+        if self.goal is None:
+            self.goal = goal
+            self.reset(start)
+        else:
+            # The player moved: adjust keys instead of rebuilding the heap
+            if goal != self.goal:
+                self.key_modifier += self.heuristic(self.goal, goal)
+                self.goal = goal
+
+            # Walls that appeared or disappeared change the costs around them
+            changed = grid.changed_tiles[self.changes_seen:]
+            self.changes_seen = len(grid.changed_tiles)
+            for tile in changed:
+                self.update_tile(tile)
+                for neighbor in grid.neighbors(tile):
+                    self.update_tile(neighbor)
+
+        self.compute_shortest_path()
+        if start != goal and self.next_tile(start) is None and start != self.root:
+            # The monster is off the path: root the search at its tile
+            self.move_root(start)
+            self.compute_shortest_path()
+
+    def is_current(self, start, goal):
+        return (start == self.start and goal == self.goal and
+                self.changes_seen == len(self.grid.changed_tiles))
+
+    def next_tile(self, tile):
+        """Tile after tile on the search tree's path to the player, or None"""
+        version = (self.root, self.goal, self.expanded, self.changes_seen)
+        if version != self.path_version:
+            # Walk the path back from the player
+            self.path_version = version
+            self.path_steps = steps = {}
+            if self.rhs[self.goal] < INFINITY:
+                parent = self.parent
+                step = self.goal
+                while parent[step] >= 0 and parent[step] not in steps:
+                    steps[parent[step]] = step
+                    step = parent[step]
+        return self.path_steps.get(tile)
+
+
+# Pre-rendered entity images keyed by kind and visual state
+sprite_cache = {}
+
+
+def cached_sprite(key, size, paint):
+    """Image for key from the sprite cache, made by paint(surface) on first use"""
+    sprite = sprite_cache.get(key)
+    if sprite is None:
+        sprite = pygame.Surface(size, pygame.SRCALPHA)
+        paint(sprite)
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert_alpha()
+        sprite_cache[key] = sprite
+    return sprite
 
-# Fonts
-font = pygame.font.SysFont('Arial', 24)
 
 class Player:
+    # Fixed attributes, so instances carry no __dict__
+    __slots__ = ("x", "y", "gold", "rect", "is_alive", "wall_break_cooldown")
+    width = PLAYER_SIZE
+    height = PLAYER_SIZE
+    speed = PLAYER_SPEED
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
-        self.width = PLAYER_SIZE
-        self.height = PLAYER_SIZE
-        self.speed = PLAYER_SPEED
         self.gold = 0
         self.rect = pygame.Rect(x, y, self.width, self.height)
         self.is_alive = True
         self.wall_break_cooldown = 0
     
-    def move(self, dx, dy, walls):
-        # Check for collisions before moving
-        new_rect = self.rect.copy()
-        new_rect.x += dx
-        new_rect.y += dy
-        
-        # Check if new position would collide with any wall
-        collision = False
-        for wall in walls:
-            if new_rect.colliderect(wall.rect):
-                collision = True
-                break
-        
-        # Only move if there's no collision
-        if not collision:
+    def move(self, dx, dy, grid):
+        # Only move if the new position doesn't collide with a wall
+        if not grid.collides(self.rect.x + dx, self.rect.y + dy, self.width, self.height):
             self.x += dx
             self.y += dy
             self.rect.x = self.x
             self.rect.y = self.y
     
-    def break_wall(self, walls):
+    def break_wall(self, grid):
         # Create a slightly larger rect to check for adjacent walls
         check_rect = self.rect.inflate(TILE_SIZE * 0.3, TILE_SIZE * 0.3)
         
-        # Find walls that collide with the check rect
-        nearby_walls = [wall for wall in walls if check_rect.colliderect(wall.rect)]
-        
-        # If there are nearby walls and player has enough gold
-        if nearby_walls and self.gold >= 10 and self.wall_break_cooldown <= 0:
-            # Sort walls by distance to player center
+        # If player has enough gold, find the wall closest to the player center
+        if self.gold >= 10 and self.wall_break_cooldown <= 0:
             player_center = (self.x + self.width/2, self.y + self.height/2)
-            
-            def distance_to_wall(wall):
-                wall_center = (wall.rect.x + wall.rect.width/2, 
-                               wall.rect.y + wall.rect.height/2)
-                return ((wall_center[0] - player_center[0])**2 + 
-                        (wall_center[1] - player_center[1])**2)**0.5
-            
-            # Get the closest wall
-            nearby_walls.sort(key=distance_to_wall)
-            wall_to_break = nearby_walls[0]
+            index = grid.nearest_wall(check_rect, player_center)
+            if index is None:
+                return None
             
             # Remove the wall
-            walls.remove(wall_to_break)
+            grid.remove_wall(index)
             
             # Deduct gold
             self.gold -= 10
             
-            # Set cooldown (45 frames = 0.75 seconds at 60fps)
-            self.wall_break_cooldown = 45
+            # Set cooldown
+            self.wall_break_cooldown = WALL_BREAK_COOLDOWN
             
-            # Create a breaking effect (simple animation)
-            return wall_to_break.rect.topleft
+            # Top-left of the broken tile, for the breaking effect
+            y, x = divmod(index, grid.width)
+            return (x * TILE_SIZE, y * TILE_SIZE)
         
         return None
     
-    def update(self):
+    def tile(self):
+        """Grid coordinates of the tile under the player's center"""
+        return (int((self.x + self.width / 2) // TILE_SIZE),
+                int((self.y + self.height / 2) // TILE_SIZE))
+    
+    def update(self, dt):
         # Update cooldown
         if self.wall_break_cooldown > 0:
-            self.wall_break_cooldown -= 1
+            self.wall_break_cooldown = count_down(self.wall_break_cooldown, dt)
+    
+    def bounds(self):
+        """Screen area covered by draw()"""
+        return self.rect.copy()
+    
+    def sprite(self):
+        return cached_sprite(("player",), (self.width, self.height),
+                             lambda surface: Player(0, 0).paint(surface))
+    
+    def draw(self, screen, offset=(0, 0)):
+        profiler.count(COUNT_DRAW_CALLS)
+        screen.blit(self.sprite(), (self.rect.x - offset[0], self.rect.y - offset[1]))
     
-    def draw(self):
-        pygame.draw.rect(screen, BLUE, self.rect)
+    def paint(self, screen, offset=(0, 0)):
+        """Draw the player from primitives; draw() uses a cached copy"""
+        x, y = self.x - offset[0], self.y - offset[1]
+        pygame.draw.rect(screen, BLUE, self.rect.move(-offset[0], -offset[1]))
         # Draw a simple face on the player
-        pygame.draw.circle(screen, WHITE, (self.x + 10, self.y + 10), 5)
-        pygame.draw.circle(screen, WHITE, (self.x + 20, self.y + 10), 5)
-        pygame.draw.arc(screen, WHITE, (self.x + 5, self.y + 15, 20, 10), 0, 3.14, 2)
-
-class Wall:
-    def __init__(self, x, y, width, height):
-        self.rect = pygame.Rect(x, y, width, height)
-    
-    def draw(self):
-        pygame.draw.rect(screen, GRAY, self.rect)
-        # Add some texture to walls
-        for i in range(0, self.rect.width, 10):
-            for j in range(0, self.rect.height, 10):
-                if (i + j) % 20 == 0:
-                    pygame.draw.rect(screen, (100, 100, 100), 
-                                    (self.rect.x + i, self.rect.y + j, 5, 5))
+        pygame.draw.circle(screen, WHITE, (x + 10, y + 10), 5)
+        pygame.draw.circle(screen, WHITE, (x + 20, y + 10), 5)
+        pygame.draw.arc(screen, WHITE, (x + 5, y + 15, 20, 10), 0, 3.14, 2)
+
+def paint_wall(screen, x, y):
+    """Draw the wall tile whose top-left pixel is (x, y)"""
+    pygame.draw.rect(screen, GRAY, (x, y, TILE_SIZE, TILE_SIZE))
+    # Add some texture to walls
+    for i in range(0, TILE_SIZE, 10):
+        for j in range(0, TILE_SIZE, 10):
+            if (i + j) % 20 == 0:
+                pygame.draw.rect(screen, (100, 100, 100), 
+                                (x + i, y + j, 5, 5))
+
+def wall_tile():
+    """An opaque surface holding one painted wall tile"""
+    tile = pygame.Surface((TILE_SIZE, TILE_SIZE))
+    paint_wall(tile, 0, 0)
+    if pygame.display.get_surface() is not None:
+        tile = tile.convert()
+    return tile
 
 class Chest:
-    def __init__(self, x, y):
+    __slots__ = ("x", "y", "gold", "is_open", "rect", "world_key")
+    width = CHEST_SIZE
+    height = CHEST_SIZE
+
+    def __init__(self, x, y, rng=random):
         self.x = x
         self.y = y
-        self.width = CHEST_SIZE
-        self.height = CHEST_SIZE
-        self.gold = random.randint(5, 20)
+        self.gold = rng.randint(5, 20)
         self.is_open = False
         self.rect = pygame.Rect(x, y, self.width, self.height)
     
     def open(self):
         self.is_open = True
     
-    def draw(self):
+    def bounds(self):
+        """Screen area covered by draw(), including the raised lid when open"""
+        lid = self.height // 4
+        return pygame.Rect(self.x, self.y - lid, self.width, self.height + lid)
+    
+    def sprite(self):
+        """Cached image of the chest in its current state, covering bounds()"""
+        lid = self.height // 4
+        
+        def paint(surface):
+            chest = Chest(0, lid, rng=random.Random(0))
+            chest.is_open = self.is_open
+            chest.paint(surface)
+        
+        return cached_sprite(("chest", self.is_open), (self.width, self.height + lid), paint)
+    
+    def draw(self, screen, offset=(0, 0)):
+        profiler.count(COUNT_DRAW_CALLS)
+        screen.blit(self.sprite(), (self.x - offset[0], self.y - self.height // 4 - offset[1]))
+    
+    def paint(self, screen, offset=(0, 0)):
+        """Draw the chest from primitives; draw() uses a cached copy"""
+        x, y = self.x - offset[0], self.y - offset[1]
         if not self.is_open:
             # Closed chest
-            pygame.draw.rect(screen, BROWN, self.rect)
+            pygame.draw.rect(screen, BROWN, (x, y, self.width, self.height))
             # Chest lid
             pygame.draw.rect(screen, (110, 50, 0), 
-                            (self.x, self.y, self.width, self.height // 3))
+                            (x, y, self.width, self.height // 3))
             # Lock
             pygame.draw.rect(screen, GOLD, 
-                            (self.x + self.width // 2 - 5, self.y + self.height // 3 - 5, 10, 10))
+                            (x + self.width // 2 - 5, y + self.height // 3 - 5, 10, 10))
         else:
             # Open chest
-            pygame.draw.rect(screen, BROWN, self.rect)
+            pygame.draw.rect(screen, BROWN, (x, y, self.width, self.height))
             # Open lid
             pygame.draw.rect(screen, (110, 50, 0), 
-                            (self.x, self.y - self.height // 4, self.width, self.height // 3))
+                            (x, y - self.height // 4, self.width, self.height // 3))
             # Gold inside
             pygame.draw.circle(screen, GOLD, 
-                            (self.x + self.width // 2, self.y + self.height // 2 + 5), 10)
+                            (x + self.width // 2, y + self.height // 2 + 5), 10)
 
 
 class Monster:
+    __slots__ = ("x", "y", "rect", "path", "path_update_delay", "path_update_timer", "planner", "search")
+    width = TILE_SIZE * 0.65  # Make monster even smaller
+    height = TILE_SIZE * 0.65  # Make monster even smaller
+    speed = PLAYER_SPEED * 0.75  # Slightly slower than player
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
-        self.width = TILE_SIZE * 0.65  # Make monster even smaller
-        self.height = TILE_SIZE * 0.65  # Make monster even smaller
-        self.speed = PLAYER_SPEED * 0.75  # Slightly slower than player
         self.rect = pygame.Rect(x, y, self.width, self.height)
         self.path = []
-        self.path_update_timer = 0
-        self.path_update_delay = 30  # Update path every 30 frames
+        self.path_update_delay = PATH_UPDATE_INTERVAL  # Update path every half second
+        self.path_update_timer = self.path_update_delay
+        # Incremental planner; when set it replaces the periodic search
+        self.planner = None
+        # What the periodic search runs on, when not the grid itself
+        self.search = None
     
-    def find_path(self, maze, player_pos, walls):
+    def find_path(self, grid, player_pos):
         """Use breadth-first search to find a path to the player"""
         # Convert positions to grid coordinates
         start_x, start_y = int(self.x / TILE_SIZE), int(self.y / TILE_SIZE)
         target_x, target_y = int(player_pos[0] / TILE_SIZE), int(player_pos[1] / TILE_SIZE)
-        
-        # Create a grid representation
-        grid_width = SCREEN_WIDTH // TILE_SIZE
-        grid_height = SCREEN_HEIGHT // TILE_SIZE
-        grid = [[0 for _ in range(grid_width)] for _ in range(grid_height)]
-        
-        # Mark walls in the grid
-        for wall in walls:
-            wall_x, wall_y = int(wall.rect.x / TILE_SIZE), int(wall.rect.y / TILE_SIZE)
-            if 0 <= wall_x < grid_width and 0 <= wall_y < grid_height:
-                grid[wall_y][wall_x] = 1
-        
-        # BFS queue
-        queue = deque([(start_x, start_y)])
-        visited = {(start_x, start_y): None}  # Map position to its predecessor
-        
-        # Directions: right, down, left, up
-        directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
-        
-        # BFS until we find the target or exhaust all options
-        found = False
-        while queue and not found:
-            x, y = queue.popleft()
-            
-            if (x, y) == (target_x, target_y):
-                found = True
-                break
-            
-            for dx, dy in directions:
-                nx, ny = x + dx, y + dy
-                
-                # Check if the position is valid
-                if (0 <= nx < grid_width and 0 <= ny < grid_height and 
-                    grid[ny][nx] == 0 and (nx, ny) not in visited):
-                    queue.append((nx, ny))
-                    visited[(nx, ny)] = (x, y)
-        
-        # Reconstruct path if found
-        path = []
-        if found:
-            current = (target_x, target_y)
-            while current != (start_x, start_y):
-                path.append(current)
-                current = visited[current]
-            path.reverse()
-        
-        # Convert grid coordinates back to pixel coordinates
-        return [(x * TILE_SIZE + TILE_SIZE // 2, y * TILE_SIZE + TILE_SIZE // 2) for x, y in path]
+        search = self.search if self.search is not None else grid
+        return search.find_path(start_x, start_y, target_x, target_y)
+    
+    def center_tile(self, grid):
+        """Index of the tile under the monster's center"""
+        return grid.index(int((self.x + self.width / 2) // TILE_SIZE),
+                          int((self.y + self.height / 2) // TILE_SIZE))
     
-    def move(self, player, walls, frame_count):
+    def replan(self, grid, player):
+        """Keep the incremental planner in step with the maze and the player.
+
+        A broken wall or a player changing tile replans immediately and
+        replaces the current waypoint; otherwise the path is only extended
+        when the monster reaches its waypoint.
+        """
+        start, goal = self.center_tile(grid), grid.index(*player.tile())
+        planner = self.planner
+        if planner.is_current(start, goal) and self.path:
+            return
+        maze_changed = (goal != planner.goal or
+                        planner.changes_seen != len(grid.changed_tiles))
+        planner.plan(start, goal)
+        if maze_changed or not self.path:
+            next_tile = planner.next_tile(start)
+            path = [next_tile] if next_tile is not None else []
+            if maze_changed:
+                # Pass through the middle of the current tile first so the
+                # new direction doesn't clip a wall corner
+                path.append(start)
+            self.path = path
+    
+    def move(self, player, grid, dt, field=None):
         """Move the monster towards the player following the path"""
-        # Update path periodically
-        if frame_count % self.path_update_delay == 0:
-            self.path = self.find_path(None, (player.x, player.y), walls)
+        if self.planner is not None:
+            self.replan(grid, player)
+        elif field is not None:
+            # Step down the shared distance field one tile at a time
+            if not self.path:
+                next_tile = field.next_tile(self.center_tile(grid))
+                if next_tile is not None:
+                    self.path = [next_tile]
+        else:
+            # Update path periodically
+            self.path_update_timer = count_down(self.path_update_timer, dt)
+            if not self.path_update_timer:
+                self.path = self.find_path(grid, (player.x, player.y))
+                self.path_update_timer = self.path_update_delay
+        profiler.mark(PHASE_PATHFINDING)
         
-        # If we have a path, follow it
+        # If we have a path, follow it (the next tile is at the end)
         if self.path:
             # Get the next point in the path
-            target_x, target_y = self.path[0]
+            target_x, target_y = grid.tile_center(self.path[-1])
             
             # Calculate direction vector
             dx = target_x - (self.x + self.width // 2)
@@ -252,20 +1014,9 @@ class Monster:
             dx = dx / distance * self.speed
             dy = dy / distance * self.speed
             
-            # Move towards next point
-            new_rect = self.rect.copy()
-            new_rect.x += dx
-            new_rect.y += dy
-            
-            # Check for wall collisions
-            collision = False
-            for wall in walls:
-                if new_rect.colliderect(wall.rect):
-                    collision = True
-                    break
-            
-            # Only move if there's no collision
-            if not collision:
+            # Only move towards next point if there's no wall collision
+            if not grid.collides(round(self.rect.x + dx), round(self.rect.y + dy),
+                                 self.rect.width, self.rect.height):
                 self.x += dx
                 self.y += dy
                 self.rect.x = self.x
@@ -274,127 +1025,374 @@ class Monster:
             # If we're close to the target point, remove it from the path
             if ((self.x + self.width // 2 - target_x)**2 + 
                 (self.y + self.height // 2 - target_y)**2) < (self.speed * 2)**2:
-                self.path.pop(0)
+                self.path.pop()
+        profiler.mark(PHASE_MONSTERS)
     
     def check_collision(self, player):
         """Check if the monster has caught the player"""
+        profiler.count(COUNT_COLLISIONS)
         return self.rect.colliderect(player.rect)
     
-    def draw(self):
-        """Draw the monster as a bank-shaped entity"""
+    def bounds(self):
+        """Screen area covered by draw(), including the roof"""
+        return self.sprite().get_rect(topleft=self.sprite_position())
+    
+    def sprite(self):
+        """Cached image of a monster, covering bounds() of a monster at a whole pixel"""
+        roof = int(self.height // 4)
+        return cached_sprite(("monster",), (int(self.width) + 2, int(self.height) + roof + 2),
+                             lambda surface: Monster(1, roof + 1).paint(surface))
+    
+    def sprite_position(self):
+        # Top-left of the sprite, padded for the roof and for the primitives
+        # rounding the float position differently
+        return (int(self.x) - 1, int(self.y) - int(self.height // 4) - 1)
+    
+    def draw(self, screen, offset=(0, 0)):
+        profiler.count(COUNT_DRAW_CALLS)
+        x, y = self.sprite_position()
+        screen.blit(self.sprite(), (x - offset[0], y - offset[1]))
+    
+    def paint(self, screen, offset=(0, 0)):
+        """Draw the monster as a bank-shaped entity from primitives; draw()
+        uses a cached copy
+        """
+        x, y = self.x - offset[0], self.y - offset[1]
+        
         # Main building
-        pygame.draw.rect(screen, RED, self.rect)
+        pygame.draw.rect(screen, RED, self.rect.move(-offset[0], -offset[1]))
         
         # Roof/top part
         roof_points = [
-            (self.x, self.y),
-            (self.x + self.width, self.y),
-            (self.x + self.width // 2, self.y - self.height // 4)
+            (x, y),
+            (x + self.width, y),
+            (x + self.width // 2, y - self.height // 4)
         ]
         pygame.draw.polygon(screen, RED, roof_points)
         
         # Columns
         column_width = self.width // 6
         column_height = self.height // 2
-        column_y = self.y + self.height - column_height
+        column_y = y + self.height - column_height
         
         # Left column
-        pygame.draw.rect(screen, WHITE, (self.x, column_y, column_width, column_height))
+        pygame.draw.rect(screen, WHITE, (x, column_y, column_width, column_height))
         # Right column
-        pygame.draw.rect(screen, WHITE, (self.x + self.width - column_width, column_y, column_width, column_height))
+        pygame.draw.rect(screen, WHITE, (x + self.width - column_width, column_y, column_width, column_height))
         # Middle column
-        pygame.draw.rect(screen, WHITE, (self.x + (self.width - column_width) // 2, column_y, column_width, column_height))
+        pygame.draw.rect(screen, WHITE, (x + (self.width - column_width) // 2, column_y, column_width, column_height))
         
         # Door
         door_width = self.width // 3
         door_height = self.height // 3
-        door_x = self.x + (self.width - door_width) // 2
-        door_y = self.y + self.height - door_height
+        door_x = x + (self.width - door_width) // 2
+        door_y = y + self.height - door_height
         pygame.draw.rect(screen, BLACK, (door_x, door_y, door_width, door_height))
         
         # Eyes (angry)
         eye_radius = 3
-        pygame.draw.circle(screen, BLACK, (self.x + self.width // 3, self.y + self.height // 3), eye_radius)
-        pygame.draw.circle(screen, BLACK, (self.x + 2 * self.width // 3, self.y + self.height // 3), eye_radius)
+        pygame.draw.circle(screen, BLACK, (x + self.width // 3, y + self.height // 3), eye_radius)
+        pygame.draw.circle(screen, BLACK, (x + 2 * self.width // 3, y + self.height // 3), eye_radius)
         
         # Mouth (angry)
-        mouth_y = self.y + self.height // 2
-        pygame.draw.line(screen, BLACK, (self.x + self.width // 4, mouth_y), 
-                         (self.x + 3 * self.width // 4, mouth_y), 2)
+        mouth_y = y + self.height // 2
+        pygame.draw.line(screen, BLACK, (x + self.width // 4, mouth_y), 
+                         (x + 3 * self.width // 4, mouth_y), 2)
 
-def generate_maze(width, height):
-    """Generate a maze using a randomized depth-first search algorithm"""
-    # Initialize the grid
-    grid = [[1 for _ in range(width)] for _ in range(height)]
-    
-    # Start from a random cell
-    start_x, start_y = random.randint(1, width-2), random.randint(1, height-2)
-    grid[start_y][start_x] = 0
-    
-    # Stack for backtracking
-    stack = [(start_x, start_y)]
-    
-    # Directions: right, down, left, up
-    directions = [(2, 0), (0, 2), (-2, 0), (0, -2)]
-    
-    while stack:
-        x, y = stack[-1]
-        
-        # Get unvisited neighbors
-        neighbors = []
-        for dx, dy in directions:
-            nx, ny = x + dx, y + dy
-            if 1 <= nx < width-1 and 1 <= ny < height-1 and grid[ny][nx] == 1:
-                neighbors.append((nx, ny, dx, dy))
-        
-        if neighbors:
-            # Choose a random unvisited neighbor
-            nx, ny, dx, dy = random.choice(neighbors)
-            
-            # Remove the wall between current cell and chosen neighbor
-            grid[y + dy//2][x + dx//2] = 0
-            grid[ny][nx] = 0
-            
-            # Push the neighbor to the stack
-            stack.append((nx, ny))
-        else:
-            # Backtrack
-            stack.pop()
-    
-    return grid
+class MonsterSwarm:
+    """Many monsters moved together with NumPy.
 
-def create_level():
-    # Define the maze grid size
-    maze_width = SCREEN_WIDTH // TILE_SIZE
-    maze_height = SCREEN_HEIGHT // TILE_SIZE
-    
-    # Generate the maze
-    maze = generate_maze(maze_width, maze_height)
+    Positions, velocities and current waypoints live in arrays, and steering,
+    waypoint advance and tile collision run as vectorised operations over the
+    whole swarm each frame. Waypoints come from the shared DistanceField,
+    read through zero-copy views of its buffers. Behaves like a crowd of
+    Monster objects following the field.
+    """
+    def __init__(self, monsters, grid):
+        self.grid = grid
+        template = monsters[0] if monsters else Monster(0, 0)
+        self.width = template.width
+        self.height = template.height
+        self.speed = template.speed
+        # Integer pixel size, as in the monsters' rects
+        self.rect_width = template.rect.width
+        self.rect_height = template.rect.height
+        self.x = np.array([monster.x for monster in monsters], dtype=np.float64)
+        self.y = np.array([monster.y for monster in monsters], dtype=np.float64)
+        self.vx = np.zeros(len(monsters))
+        self.vy = np.zeros(len(monsters))
+        # Tile index each monster is heading for, -1 when it needs a new one
+        self.waypoint = np.full(len(monsters), -1, dtype=np.int64)
+        self.cells = np.frombuffer(grid.cells, dtype=np.uint8)
+        self.template = template
+
+    def attach(self, grid):
+        """Switch to a new grid, dropping waypoints that belonged to the old one"""
+        self.grid = grid
+        self.cells = np.frombuffer(grid.cells, dtype=np.uint8)
+        self.waypoint[:] = -1
+
+    def __len__(self):
+        return len(self.x)
+
+    def _downhill(self, tiles, distance):
+        """Vectorised DistanceField.next_tile; -1 where there is no step"""
+        width, size = self.grid.width, len(distance)
+        current = distance[tiles]
+        column = tiles % width
+        result = np.full(len(tiles), -1, dtype=np.int64)
+        # Neighbors: right, down, left, up
+        for offset, valid in ((1, column < width - 1),
+                              (width, tiles + width < size),
+                              (-1, column > 0),
+                              (-width, tiles - width >= 0)):
+            neighbor = np.clip(tiles + offset, 0, size - 1)
+            step = (valid & (result < 0) & (current > 0) &
+                    (distance[neighbor] == current - 1))
+            result[step] = neighbor[step]
+        return result
+
+    def _blocked(self, left, top):
+        """Which rects at the given integer positions overlap a wall tile"""
+        grid = self.grid
+        x0, y0 = left // TILE_SIZE, top // TILE_SIZE
+        x1 = (left + self.rect_width - 1) // TILE_SIZE
+        y1 = (top + self.rect_height - 1) // TILE_SIZE
+        outside = (x0 < 0) | (y0 < 0) | (x1 >= grid.width) | (y1 >= grid.height)
+        x0, x1 = np.clip(x0, 0, grid.width - 1), np.clip(x1, 0, grid.width - 1)
+        y0, y1 = np.clip(y0, 0, grid.height - 1), np.clip(y1, 0, grid.height - 1)
+        cells, width = self.cells, grid.width
+        return (outside | (cells[y0 * width + x0] == 1) | (cells[y0 * width + x1] == 1) |
+                (cells[y1 * width + x0] == 1) | (cells[y1 * width + x1] == 1))
+
+    def move(self, field):
+        """Move every monster one frame towards the player"""
+        if not len(self):
+            return
+        width = self.grid.width
+        half_width, half_height = self.width // 2, self.height // 2
+        distance = np.frombuffer(field.distance, dtype=np.int32)
+
+        # Monsters without a waypoint take one step down the distance field
+        need = self.waypoint < 0
+        if need.any():
+            tiles = (((self.y[need] + self.height / 2) // TILE_SIZE).astype(np.int64) * width +
+                     ((self.x[need] + self.width / 2) // TILE_SIZE).astype(np.int64))
+            self.waypoint[need] = self._downhill(tiles, distance)
+        active = self.waypoint >= 0
+
+        # Steer towards the waypoint's center
+        target_x = (self.waypoint % width) * TILE_SIZE + TILE_SIZE // 2
+        target_y = (self.waypoint // width) * TILE_SIZE + TILE_SIZE // 2
+        dx = target_x - (self.x + half_width)
+        dy = target_y - (self.y + half_height)
+        distance_to_target = np.maximum(1, np.hypot(dx, dy))
+        self.vx = np.where(active, dx / distance_to_target * self.speed, 0.0)
+        self.vy = np.where(active, dy / distance_to_target * self.speed, 0.0)
+
+        # Only move where the new rect stays clear of walls
+        profiler.count(COUNT_COLLISIONS, len(self))
+        blocked = self._blocked(np.floor(self.x + self.vx + 0.5).astype(np.int64),
+                                np.floor(self.y + self.vy + 0.5).astype(np.int64))
+        moving = active & ~blocked
+        self.x += np.where(moving, self.vx, 0.0)
+        self.y += np.where(moving, self.vy, 0.0)
+
+        # Drop waypoints that have been reached
+        arrived = active & (((self.x + half_width - target_x) ** 2 +
+                             (self.y + half_height - target_y) ** 2) < (self.speed * 2) ** 2)
+        self.waypoint[arrived] = -1
+
+    def check_collision(self, player):
+        """Check if any monster has caught the player"""
+        profiler.count(COUNT_COLLISIONS, len(self))
+        rect = player.rect
+        left = np.floor(self.x + 0.5)
+        top = np.floor(self.y + 0.5)
+        return bool(np.any((left < rect.right) & (left + self.rect_width > rect.left) &
+                           (top < rect.bottom) & (top + self.rect_height > rect.top)))
+
+    def bounds(self):
+        """Screen areas covered by draw()"""
+        roof = int(self.height // 4)
+        width, height = self.template.sprite().get_size()
+        return [pygame.Rect(x - 1, y - roof - 1, width, height)
+                for x, y in zip(self.x.astype(int).tolist(), self.y.astype(int).tolist())]
+
+    def draw(self, screen, offset=(0, 0)):
+        """Blit the cached monster image once per member that is on screen"""
+        roof = int(self.height // 4)
+        sprite = self.template.sprite()
+        x = self.x.astype(int) - offset[0]
+        y = self.y.astype(int) - offset[1]
+        screen_width, screen_height = screen.get_size()
+        visible = ((x + sprite.get_width() > 0) & (x - 1 < screen_width) &
+                   (y + self.height > 0) & (y - roof - 1 < screen_height))
+        blits = [(sprite, (sprite_x - 1, sprite_y - roof - 1))
+                 for sprite_x, sprite_y in zip(x[visible].tolist(), y[visible].tolist())]
+        profiler.count(COUNT_DRAW_CALLS, len(blits))
+        screen.blits(blits, doreturn=False)
+
+
+def generate_mazes(count, width, height, rng=None):
+    """Generate several independent mazes at once.
+
+    Returns a (count, height, width) uint8 array with 1 for wall and 0 for
+    open. Uses the sidewinder algorithm, which decides every row on its own
+    and so runs as a handful of NumPy operations over all rows of all mazes;
+    each maze is randomly mirrored so the straight corridor sidewinder leaves
+    along one edge isn't always in the same place. Sidewinder mazes have
+    shorter paths and more dead ends than generate_maze() gives, so this is
+    for bulk generation and maps too big for that.
+    """
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+    mazes = np.ones((count, height, width), dtype=np.uint8)
+    cols, rows = (width - 1) // 2, (height - 1) // 2
+    if cols < 1 or rows < 1:
+        return mazes
+
+    # Cells sit on odd coordinates with walls in between
+    mazes[:, 1:2 * rows:2, 1:2 * cols:2] = 0
+
+    # Each row is split into runs of cells joined east to west; the top row
+    # is one long run
+    close = rng.random((count, rows, cols), dtype=np.float32) < 0.5
+    close[:, 0, :] = False
+    close[:, :, -1] = True
+    east = mazes[:, 1:2 * rows:2, 2:2 * cols - 1:2]
+    east[~close[:, :, :-1]] = 0
+
+    # Every run below the top row opens north from one random cell
+    if rows > 1:
+        run_ends = close[:, 1:, :].ravel()
+        run_starts = np.flatnonzero(np.concatenate(([True], run_ends[:-1])))
+        run_lengths = np.diff(np.append(run_starts, run_ends.size))
+        keys = rng.random(run_ends.size, dtype=np.float32)
+        chosen = keys == np.repeat(np.maximum.reduceat(keys, run_starts), run_lengths)
+        north = mazes[:, 2:2 * rows - 1:2, 1:2 * cols:2]
+        north[chosen.reshape(count, rows - 1, cols)] = 0
+
+    # Mirror some mazes on each axis
+    for i in np.flatnonzero(rng.random(count) < 0.5):
+        mazes[i] = mazes[i, :, ::-1].copy()
+    for i in np.flatnonzero(rng.random(count) < 0.5):
+        mazes[i] = mazes[i, ::-1, :].copy()
+    return mazes
+
+def generate_maze(width, height, rng=None):
+    """Generate a maze using a randomized depth-first search algorithm.
+
+    Returns a (height, width) uint8 array (1 = wall, 0 = open) with cells on
+    odd coordinates, like generate_mazes(). The search carves one cell at a
+    time over a flat bytearray, with the random numbers for its choices
+    drawn up front.
+    """
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+    cells = bytearray(b"\x01") * (width * height)
+    cols, rows = (width - 1) // 2, (height - 1) // 2
+    if cols >= 1 and rows >= 1:
+        # One number per cell carved after the first
+        choices = rng.random(cols * rows).tolist()
+        carved = 0
+
+        # Start from a random cell
+        start = (2 * int(rng.integers(rows)) + 1) * width + 2 * int(rng.integers(cols)) + 1
+        cells[start] = 0
+        stack = [start]
+        while stack:
+            current = stack[-1]
+            y, x = divmod(current, width)
+
+            # Steps to unvisited neighbors: right, down, left, up
+            neighbors = []
+            if x + 2 < width - 1 and cells[current + 2]:
+                neighbors.append(2)
+            if y + 2 < height - 1 and cells[current + 2 * width]:
+                neighbors.append(2 * width)
+            if x > 1 and cells[current - 2]:
+                neighbors.append(-2)
+            if y > 1 and cells[current - 2 * width]:
+                neighbors.append(-2 * width)
+
+            if neighbors:
+                # Remove the wall between the current cell and a random neighbor
+                step = neighbors[int(choices[carved] * len(neighbors))]
+                carved += 1
+                cells[current + step // 2] = 0
+                cells[current + step] = 0
+                stack.append(current + step)
+            else:
+                # Backtrack
+                stack.pop()
+    return np.frombuffer(cells, dtype=np.uint8).reshape(height, width)
+
+def build_maze(maze):
+    """Create the TileGrid for a maze.
+
+    Returns it with the top-left pixel position of every open tile, in row order.
+    """
+    grid = TileGrid(maze)
+    ys, xs = np.divmod(np.flatnonzero(np.frombuffer(grid.cells, dtype=np.uint8) == 0), grid.width)
+    open_positions = list(zip((xs * TILE_SIZE).tolist(), (ys * TILE_SIZE).tolist()))
+    return grid, open_positions
+
+def spawn_positions(grid, taken, player, count):
+    """Pick tiles for monsters, farthest from the player through the maze first.
+
+    taken holds pixel positions of tiles that can't be used. Unreachable
+    tiles come last. Returns top-left pixel positions.
+    """
+    field = DistanceField(grid)
+    field.update(*player.tile())
+    distance = np.frombuffer(field.distance, dtype=np.int32)
+    free = np.frombuffer(grid.cells, dtype=np.uint8) == 0
+    for x, y in taken:
+        free[grid.index(x // TILE_SIZE, y // TILE_SIZE)] = False
+    tiles = np.flatnonzero(free)
+    tiles = tiles[np.argsort(-distance[tiles], kind="stable")]
+    if not len(tiles):
+        return []
+    # With more monsters than free tiles, they start stacked on the farther half
+    if count > len(tiles):
+        tiles = tiles[:max(1, len(tiles) // 2)]
+    positions = []
+    for i in range(count):
+        y, x = divmod(int(tiles[i % len(tiles)]), grid.width)
+        positions.append((x * TILE_SIZE, y * TILE_SIZE))
+    return positions
+
+def create_level(monster_count=1, maze_width=None, maze_height=None, rng=random):
+    # Define the maze grid size, one screenful unless asked for a bigger world
+    maze_width = maze_width or SCREEN_WIDTH // TILE_SIZE
+    maze_height = maze_height or SCREEN_HEIGHT // TILE_SIZE
     
-    walls = []
-    possible_chest_positions = []
+    # Generate the maze; worlds too big to carve a cell at a time get a
+    # faster but easier sidewinder maze
+    maze_rng = np.random.default_rng(rng.getrandbits(64))
+    if maze_width * maze_height > LARGE_MAZE_TILES:
+        maze = generate_mazes(1, maze_width, maze_height, maze_rng)[0]
+    else:
+        maze = generate_maze(maze_width, maze_height, maze_rng)
     
-    # Create walls from the maze
-    for y in range(maze_height):
-        for x in range(maze_width):
-            if maze[y][x] == 1:
-                walls.append(Wall(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE))
-            else:
-                # Add empty spaces as possible chest positions
-                possible_chest_positions.append((x * TILE_SIZE, y * TILE_SIZE))
+    # Empty spaces are possible chest positions
+    grid, possible_chest_positions = build_maze(maze)
     
     # Create some chests at random empty positions
     chests = []
-    chest_count = min(10, len(possible_chest_positions))
-    chest_positions = random.sample(possible_chest_positions, chest_count)
+    screens = max(1, (maze_width * maze_height) // ((SCREEN_WIDTH // TILE_SIZE) * (SCREEN_HEIGHT // TILE_SIZE)))
+    chest_count = min(CHESTS_PER_SCREEN * screens, len(possible_chest_positions))
+    chest_positions = rng.sample(possible_chest_positions, chest_count)
     
     for x, y in chest_positions:
         chests.append(Chest(x + (TILE_SIZE - CHEST_SIZE) // 2, 
-                           y + (TILE_SIZE - CHEST_SIZE) // 2))
+                           y + (TILE_SIZE - CHEST_SIZE) // 2, rng))
     
     # Find a good starting position for the player
+    taken = set(chest_positions)
     for pos in possible_chest_positions:
-        if pos not in chest_positions:
+        if pos not in taken:
             player_x, player_y = pos
             player_x += (TILE_SIZE - PLAYER_SIZE) // 2
             player_y += (TILE_SIZE - PLAYER_SIZE) // 2
@@ -402,171 +1400,1568 @@ def create_level():
     
     player = Player(player_x, player_y)
     
-    # Find a starting position for the monster far from the player
-    monster_pos = None
-    max_distance = 0
-    for pos in possible_chest_positions:
-        if pos not in chest_positions:
-            distance = ((pos[0] - player_x) ** 2 + (pos[1] - player_y) ** 2) ** 0.5
-            if distance > max_distance:
-                max_distance = distance
-                monster_pos = pos
+    # Find starting positions for the monsters far from the player
+    monsters = [Monster(x, y) for x, y in spawn_positions(grid, taken, player, monster_count)]
     
-    monster = None
-    if monster_pos:
-        monster = Monster(monster_pos[0], monster_pos[1])
+    return player, chests, monsters, grid
+
+# Binary level format: a header, the player's tile, every monster's tile,
+# every chest's tile and gold, then the walls at one bit per tile in row
+# order. All numbers are little-endian.
+LEVEL_MAGIC = b"CGLV"
+LEVEL_VERSION = 1
+LEVEL_HEADER = struct.Struct("<4sHHHII")  # magic, version, width, height, chests, monsters
+# Tile coordinates are stored as u16
+MAX_LEVEL_SIZE = 0xFFFF
+TILE_DTYPE = np.dtype([("x", "<u2"), ("y", "<u2")])
+CHEST_DTYPE = np.dtype([("x", "<u2"), ("y", "<u2"), ("gold", "u1")])
+
+# Level library: a header, one fixed-size index entry per level, then the
+# levels themselves back to back
+LIBRARY_MAGIC = b"CGLB"
+LIBRARY_VERSION = 1
+LIBRARY_HEADER = struct.Struct("<4sHxxQ")  # magic, version, level count
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("size", "<u4")])
+
+def encode_level(player, chests, monsters, grid):
+    """Pack a freshly created level into the binary level format.
+
+    Positions are stored as tiles, so entities must sit where create_level
+    puts them.
+    """
+    if grid.width > MAX_LEVEL_SIZE or grid.height > MAX_LEVEL_SIZE:
+        raise ValueError(f"Levels are limited to {MAX_LEVEL_SIZE} tiles across, "
+                         f"not {grid.width}x{grid.height}")
+    header = LEVEL_HEADER.pack(LEVEL_MAGIC, LEVEL_VERSION, grid.width, grid.height,
+                               len(chests), len(monsters))
+    player_tile = np.array([player.tile()], dtype=TILE_DTYPE)
+    monster_tiles = np.array([(int(monster.x) // TILE_SIZE, int(monster.y) // TILE_SIZE)
+                              for monster in monsters], dtype=TILE_DTYPE)
+    chest_tiles = np.array([(chest.rect.centerx // TILE_SIZE, chest.rect.centery // TILE_SIZE, chest.gold)
+                            for chest in chests], dtype=CHEST_DTYPE)
+    walls = np.packbits(np.frombuffer(grid.cells, dtype=np.uint8), bitorder="little")
+    return b"".join((header, player_tile.tobytes(), monster_tiles.tobytes(),
+                     chest_tiles.tobytes(), walls.tobytes()))
+
+def decode_level(data):
+    """Build (player, chests, monsters, grid) from a level in the binary format.
+
+    data can be any buffer, such as a slice of a memory-mapped level
+    library; it is read in place, not copied.
+    """
+    magic, version, width, height, chest_count, monster_count = LEVEL_HEADER.unpack_from(data)
+    if magic != LEVEL_MAGIC:
+        raise ValueError("Not a chest game level")
+    if version != LEVEL_VERSION:
+        raise ValueError(f"Unsupported level version {version}")
+    offset = LEVEL_HEADER.size
+    player_tile = np.frombuffer(data, TILE_DTYPE, 1, offset)
+    offset += player_tile.nbytes
+    monster_tiles = np.frombuffer(data, TILE_DTYPE, monster_count, offset)
+    offset += monster_tiles.nbytes
+    chest_tiles = np.frombuffer(data, CHEST_DTYPE, chest_count, offset)
+    offset += chest_tiles.nbytes
+    size = width * height
+    walls = np.frombuffer(data, np.uint8, (size + 7) // 8, offset)
+    grid = TileGrid(np.unpackbits(walls, count=size, bitorder="little").reshape(height, width))
+
+    (x, y), = player_tile.tolist()
+    player = Player(x * TILE_SIZE + (TILE_SIZE - PLAYER_SIZE) // 2,
+                    y * TILE_SIZE + (TILE_SIZE - PLAYER_SIZE) // 2)
+    # The gold comes from the file, not the RNG
+    rng = random.Random(0)
+    chests = []
+    for x, y, gold in chest_tiles.tolist():
+        chest = Chest(x * TILE_SIZE + (TILE_SIZE - CHEST_SIZE) // 2,
+                      y * TILE_SIZE + (TILE_SIZE - CHEST_SIZE) // 2, rng)
+        chest.gold = gold
+        chests.append(chest)
+    monsters = [Monster(x * TILE_SIZE, y * TILE_SIZE) for x, y in monster_tiles.tolist()]
+    return player, chests, monsters, grid
+
+def save_level_library(path, levels):
+    """Write encoded levels to a level library file"""
+    levels = list(levels)
+    index = np.zeros(len(levels), dtype=INDEX_DTYPE)
+    offset = LIBRARY_HEADER.size + index.nbytes
+    for i, level in enumerate(levels):
+        index[i] = (offset, len(level))
+        offset += len(level)
+    with open(path, "wb") as f:
+        f.write(LIBRARY_HEADER.pack(LIBRARY_MAGIC, LIBRARY_VERSION, len(levels)))
+        f.write(index.tobytes())
+        for level in levels:
+            f.write(level)
+
+def make_level_library(path, count, seed=None, monster_count=1, world_size=None):
+    """Generate count levels and save them as a level library.
+
+    Levels are drawn from the seed exactly as Game(seed=seed) draws them,
+    so level n of the library is the level that game would play nth.
+    Returns a dict of stats.
+    """
+    rng = random.Random(seed if seed is not None else random.getrandbits(64))
+    start = time.perf_counter()
+    save_level_library(path, (encode_level(*create_level(monster_count, *(world_size or (None, None)),
+                                                         rng=random.Random(rng.getrandbits(64))))
+                              for _ in range(count)))
+    elapsed = time.perf_counter() - start
+    return {
+        "levels": count,
+        "bytes": os.path.getsize(path),
+        "seconds": elapsed,
+    }
+
+class LevelLibrary:
+    """A level library file, memory-mapped read-only.
+
+    The index has one fixed-size entry per level, so finding level n is a
+    single lookup, and load(n) decodes straight out of the mapping without
+    reading any other level. close() releases any views from level_data()
+    still held, so they can't be used afterwards.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < LIBRARY_HEADER.size:
+                raise ValueError(f"{path} is not a chest game level library")
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            count = self._check_layout(path)
+        except Exception:
+            self.map.close()
+            raise
+        self.index = np.frombuffer(self.map, INDEX_DTYPE, count, LIBRARY_HEADER.size)
+        # Views handed out by level_data(), released on close()
+        self.views = weakref.WeakSet()
+
+    def _check_layout(self, path):
+        """Validate the header and index against the file size; returns the level count"""
+        magic, version, count = LIBRARY_HEADER.unpack_from(self.map)
+        if magic != LIBRARY_MAGIC:
+            raise ValueError(f"{path} is not a chest game level library")
+        if version != LIBRARY_VERSION:
+            raise ValueError(f"Unsupported level library version {version}")
+        index_end = LIBRARY_HEADER.size + count * INDEX_DTYPE.itemsize
+        if index_end > len(self.map):
+            raise ValueError(f"{path} is truncated: its index of {count} levels runs past the end")
+        # Checked on a copy, so no view into the map is left behind on failure
+        index = np.frombuffer(self.map[LIBRARY_HEADER.size:index_end], INDEX_DTYPE)
+        ends = index["offset"].astype(np.uint64) + index["size"]
+        if len(index) and (index["offset"].min() < index_end or ends.max() > len(self.map)):
+            raise ValueError(f"{path} is truncated: a level lies outside the file")
+        return count
+
+    def __len__(self):
+        return len(self.index)
+
+    def level_data(self, n):
+        """The encoded level n, as a view into the mapped file"""
+        offset, size = self.index[n].tolist()
+        with memoryview(self.map) as whole:
+            view = whole[offset:offset + size]
+        self.views.add(view)
+        return view
+
+    def monster_count(self, n):
+        """Number of monsters in level n, read from its header"""
+        with self.level_data(n) as view:
+            return LEVEL_HEADER.unpack_from(view)[5]
+
+    def load(self, n):
+        """Build (player, chests, monsters, grid) for level n"""
+        with self.level_data(n) as view:
+            return decode_level(view)
+
+    def close(self):
+        # Views into the mapping have to go before it can be closed
+        for view in list(self.views):
+            view.release()
+        self.index = None
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def generate_chunk(seed, chunk_x, chunk_y):
+    """Generate one endless-mode chunk from the world seed and its coordinates.
+
+    Returns a (CHUNK_SIZE, CHUNK_SIZE) uint8 maze and the chest spots in it
+    as (x, y, gold) in local tiles. Row 0 and column 0 are the wall lines
+    shared with the chunks to the north and west, each with one door
+    between two cells, so neighboring chunks always join up no matter
+    which one was generated first.
+    """
+    rng = np.random.default_rng([seed, chunk_x & 0xFFFFFFFF, chunk_y & 0xFFFFFFFF])
+    tiles = generate_maze(CHUNK_SIZE + 1, CHUNK_SIZE + 1, rng)[:CHUNK_SIZE, :CHUNK_SIZE].copy()
+    cells = CHUNK_SIZE // 2
+    tiles[2 * rng.integers(cells) + 1, 0] = 0  # West door
+    tiles[0, 2 * rng.integers(cells) + 1] = 0  # North door
     
-    return player, walls, chests, monster
+    # Chests go on open tiles, but never where the player starts
+    open_tiles = np.flatnonzero(tiles == 0)
+    open_tiles = open_tiles[open_tiles != CHUNK_SIZE + 1]
+    chests = []
+    for index in rng.choice(open_tiles, min(CHESTS_PER_CHUNK, len(open_tiles)), replace=False):
+        y, x = divmod(int(index), CHUNK_SIZE)
+        chests.append((x, y, int(rng.integers(5, 21))))
+    return tiles, chests
+
+class ChunkedWorld:
+    """Endless maze generated chunk by chunk as the player explores.
+
+    Generated chunks are kept in a bounded LRU cache and regenerated from
+    the seed when they are needed again after eviction. Broken walls and
+    opened chests are the only state that can't be regenerated, so they are
+    kept as small per-chunk diffs and applied on top.
+    """
+    def __init__(self, seed, cache_size=32):
+        self.seed = seed
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        # Per chunk: local indices of broken walls, numbers of opened chests
+        self.broken_walls = {}
+        self.opened_chests = {}
+        self.chunks_generated = 0
+
+    def chunk(self, chunk_x, chunk_y):
+        """Tiles and chest spots of a chunk, generating it if needed"""
+        key = (chunk_x, chunk_y)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        tiles, chests = generate_chunk(self.seed, chunk_x, chunk_y)
+        for index in self.broken_walls.get(key, ()):
+            tiles.flat[index] = 0
+        self.cache[key] = (tiles, chests)
+        self.chunks_generated += 1
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return tiles, chests
+
+    def break_wall(self, tile_x, tile_y):
+        """Remember a broken wall at world tile coordinates"""
+        chunk_x, x = divmod(tile_x, CHUNK_SIZE)
+        chunk_y, y = divmod(tile_y, CHUNK_SIZE)
+        self.broken_walls.setdefault((chunk_x, chunk_y), set()).add(y * CHUNK_SIZE + x)
+        if (chunk_x, chunk_y) in self.cache:
+            self.cache[(chunk_x, chunk_y)][0][y, x] = 0
+
+    def open_chest(self, chunk_x, chunk_y, number):
+        self.opened_chests.setdefault((chunk_x, chunk_y), set()).add(number)
+
+    def window(self, chunk_x, chunk_y, size):
+        """Maze for size x size chunks starting at a chunk, with its chests.
+
+        Chests are (key, x, y, gold, is_open) in tiles of the window, where
+        key identifies the chest for open_chest().
+        """
+        rows, chests = [], []
+        for j in range(size):
+            row = []
+            for i in range(size):
+                key = (chunk_x + i, chunk_y + j)
+                tiles, spots = self.chunk(*key)
+                row.append(tiles)
+                opened = self.opened_chests.get(key, ())
+                for number, (x, y, gold) in enumerate(spots):
+                    chests.append((key + (number,), i * CHUNK_SIZE + x, j * CHUNK_SIZE + y,
+                                   gold, number in opened))
+            rows.append(row)
+        return np.block(rows), chests
+
+class LevelFactory:
+    """Keeps a few levels generated ahead of time on a worker thread.
+
+    Levels come out in the same order their seeds were drawn from seed_rng,
+    so a seeded game gets exactly the levels it would have generated itself.
+    The worker runs until close() is called, or until building a level
+    fails; next_level() then raises that error.
+    """
+    def __init__(self, build, seed_rng, size=2):
+        self.build = build
+        self.seed_rng = seed_rng
+        self.ready = queue.Queue(maxsize=size)
+        self.stopped = threading.Event()
+        self.worker = threading.Thread(target=self._fill, name="level-factory", daemon=True)
+        self.worker.start()
+
+    def _fill(self):
+        # Blocks on the full queue until a level is taken
+        while not self.stopped.is_set():
+            level_rng = random.Random(self.seed_rng.getrandbits(64))
+            try:
+                level = self.build(level_rng)
+            except Exception as error:
+                # Hand the failure to the game thread instead of dying silently
+                self.ready.put(error)
+                return
+            self.ready.put((level_rng, level))
+
+    def close(self):
+        """Stop the worker and wait for it to finish"""
+        self.stopped.set()
+        # Make room for a put the worker may be blocked on; it then sees the
+        # stop and puts nothing more
+        while self.worker.is_alive():
+            try:
+                self.ready.get(timeout=0.05)
+            except queue.Empty:
+                pass
+        self.worker.join()
+
+    def next_level(self):
+        """Take the next finished level, waiting if none is ready yet"""
+        level = self.ready.get()
+        if isinstance(level, Exception):
+            # The worker has stopped; later calls fail the same way
+            self.ready.put(level)
+            raise level
+        return level
+
+
+class Action:
+    """Player input for a single simulation tick"""
+    def __init__(self, dx=0, dy=0, break_wall=False):
+        # Movement direction on each axis: -1, 0 or 1
+        self.dx = dx
+        self.dy = dy
+        self.break_wall = break_wall
+
+
+NO_ACTION = Action()
+
+
+class Game:
+    """Headless simulation of one chest game session.
+
+    Owns the level and all rule logic (movement, monster AI, chest pickup,
+    win/lose checks) and advances it one tick per step() call. It never
+    touches pygame.display, so it runs under the SDL dummy driver or without
+    any surface at all; main() only renders from it.
+    """
+    def __init__(self, monster_count=1, pathfinding=None, swarm=False, world_size=None,
+                 endless=False, world_seed=None, seed=None, prefetch=0, interpolate=False,
+                 levels=None):
+        # Every level is generated from a private RNG seeded from this, so a
+        # seed plus the inputs reproduces a whole session
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        self.rng = random.Random(self.seed)
+        # Play the levels of a level library file in order instead of
+        # generating them; the monster count (of the first level, which also
+        # picks the default pathfinding) and world size then come from the file
+        self.library = LevelLibrary(levels) if levels else None
+        self.levels_played = 0
+        if self.library is not None:
+            if not len(self.library):
+                self.library.close()
+                raise ValueError(f"Level library {levels} holds no levels")
+            monster_count = self.library.monster_count(0)
+        self.monster_count = monster_count
+        # Maze size in tiles; None for a single screen
+        self.world_size = world_size
+        # Endless exploration over a ChunkedWorld instead of a finite level
+        self.endless = endless
+        self.world_seed = world_seed
+        # Several monsters share one distance field to the player by default
+        # instead of each running its own search; a swarm always does
+        if pathfinding is None or swarm:
+            pathfinding = PATHFINDING_FIELD if monster_count > 1 or swarm else PATHFINDING_BFS
+        self.pathfinding = pathfinding
+        self.use_swarm = swarm
+        # Keep last tick's positions so a renderer can draw between ticks
+        self.interpolate = interpolate
+        # Generate upcoming levels in the background so restarts are instant
+        self.level_factory = None
+        if prefetch and not endless and self.library is None:
+            self.level_factory = LevelFactory(self._build_level, self.rng, prefetch)
+        self.reset()
+
+    def close(self):
+        """Stop generating levels in the background and close the level library"""
+        if self.level_factory is not None:
+            self.level_factory.close()
+            self.level_factory = None
+        if self.library is not None:
+            self.library.close()
+            self.library = None
+
+    def _build_level(self, level_rng):
+        return create_level(self.monster_count, *(self.world_size or (None, None)), rng=level_rng)
+
+    def reset(self):
+        """Start a new level"""
+        self.world = None
+        if self.level_factory is not None:
+            self.level_rng, level = self.level_factory.next_level()
+            self.player, self.chests, self.monsters, self.grid = level
+        else:
+            self.level_rng = random.Random(self.rng.getrandbits(64))
+            if self.endless:
+                self._start_endless()
+            elif self.library is not None:
+                # Start over from the first level after the last one
+                level = self.library.load(self.levels_played % len(self.library))
+                self.player, self.chests, self.monsters, self.grid = level
+                self.levels_played += 1
+            else:
+                self.player, self.chests, self.monsters, self.grid = self._build_level(self.level_rng)
+        self.swarm = None
+        if self.use_swarm:
+            # The swarm replaces the individual Monster objects
+            self.swarm = MonsterSwarm(self.monsters, self.grid)
+            self.monsters = []
+        self._index_chests()
+        self._index_monsters()
+        self._attach_pathfinding()
+        self._remember_positions()
+        self.frame_count = 0
+        self.game_over = False
+        self.win = False
+        self.events = []
+
+    def _index_chests(self):
+        # Chests keyed by the tile under their center; a chest is smaller
+        # than a tile and placed inside one, so this is the only tile it covers
+        self.chest_index = {}
+        for chest in self.chests:
+            tile = self.grid.index(chest.rect.centerx // TILE_SIZE, chest.rect.centery // TILE_SIZE)
+            self.chest_index.setdefault(tile, []).append(chest)
+        # Kept up to date as chests open so the win check doesn't scan them
+        self.chests_left = sum(not chest.is_open for chest in self.chests)
+
+    def _index_monsters(self):
+        # Monsters keyed by the tile under their center, so a renderer can
+        # find the ones in view without scanning them all
+        self.monster_tiles = {}
+        self.monster_index = {}
+        for monster in self.monsters:
+            tile = monster.center_tile(self.grid)
+            self.monster_tiles[monster] = tile
+            self.monster_index.setdefault(tile, []).append(monster)
+
+    def _update_monster_index(self):
+        """Move the monsters that entered another tile to their new index entry"""
+        grid, tiles, index = self.grid, self.monster_tiles, self.monster_index
+        for monster in self.monsters:
+            tile = monster.center_tile(grid)
+            old = tiles[monster]
+            if tile != old:
+                index[old].remove(monster)
+                if not index[old]:
+                    del index[old]
+                index.setdefault(tile, []).append(monster)
+                tiles[monster] = tile
+
+    def _remember_positions(self):
+        # Where the moving entities were at the start of the tick
+        if not self.interpolate:
+            return
+        self.previous_positions = [(entity.x, entity.y) for entity in [self.player] + self.monsters]
+        if self.swarm is not None:
+            self.previous_swarm = (self.swarm.x.copy(), self.swarm.y.copy())
+
+    @contextmanager
+    def interpolated(self, alpha):
+        """Place the moving entities alpha of the way from their previous to
+        their current tick positions for drawing, and put them back after.
+        """
+        if not self.interpolate:
+            yield
+            return
+        entities = [self.player] + self.monsters
+        current = [(entity.x, entity.y) for entity in entities]
+        for entity, (x0, y0), (x1, y1) in zip(entities, self.previous_positions, current):
+            entity.x, entity.y = x0 + (x1 - x0) * alpha, y0 + (y1 - y0) * alpha
+            entity.rect.x, entity.rect.y = entity.x, entity.y
+        if self.swarm is not None:
+            swarm_x, swarm_y = self.swarm.x, self.swarm.y
+            previous_x, previous_y = self.previous_swarm
+            self.swarm.x = previous_x + (swarm_x - previous_x) * alpha
+            self.swarm.y = previous_y + (swarm_y - previous_y) * alpha
+        try:
+            yield
+        finally:
+            for entity, (x, y) in zip(entities, current):
+                entity.x, entity.y = x, y
+                entity.rect.x, entity.rect.y = x, y
+            if self.swarm is not None:
+                self.swarm.x, self.swarm.y = swarm_x, swarm_y
+
+    def _attach_pathfinding(self):
+        """Set up the monsters' pathfinding for the current grid"""
+        self.field = DistanceField(self.grid) if self.pathfinding == PATHFINDING_FIELD else None
+        bitboard = Bitboard(self.grid) if self.pathfinding == PATHFINDING_BITBOARD else None
+        for monster in self.monsters:
+            monster.path = []
+            monster.search = bitboard
+            if self.pathfinding == PATHFINDING_DSTAR:
+                monster.planner = DStarLite(self.grid)
+        if self.swarm is not None:
+            self.swarm.attach(self.grid)
+
+    def _start_endless(self):
+        seed = self.world_seed if self.world_seed is not None else self.level_rng.getrandbits(32)
+        self.world = ChunkedWorld(seed)
+        # The window's top-left chunk; the player starts in chunk (0, 0)
+        center = WINDOW_CHUNKS // 2
+        self.origin = (-center, -center)
+        self._load_window()
+        start = (center * CHUNK_SIZE + 1) * TILE_SIZE
+        self.player = Player(start + (TILE_SIZE - PLAYER_SIZE) // 2, start + (TILE_SIZE - PLAYER_SIZE) // 2)
+        self.monsters = [Monster(x, y) for x, y in self._spawn_positions(self.monster_count)]
+
+    def _load_window(self):
+        """Build the walls, grid and chests for the chunks around the origin"""
+        maze, chest_spots = self.world.window(*self.origin, WINDOW_CHUNKS)
+        self.grid, _ = build_maze(maze)
+        self.chests = []
+        for key, x, y, gold, is_open in chest_spots:
+            chest = Chest(x * TILE_SIZE + (TILE_SIZE - CHEST_SIZE) // 2,
+                          y * TILE_SIZE + (TILE_SIZE - CHEST_SIZE) // 2, self.level_rng)
+            chest.gold = gold
+            chest.is_open = is_open
+            chest.world_key = key
+            self.chests.append(chest)
+
+    def _spawn_positions(self, count):
+        taken = [(chest.x - (TILE_SIZE - CHEST_SIZE) // 2, chest.y - (TILE_SIZE - CHEST_SIZE) // 2)
+                 for chest in self.chests]
+        return spawn_positions(self.grid, taken, self.player, count)
+
+    def _follow_player(self):
+        """Move the endless-mode window when the player leaves its center chunk.
+
+        Everything is shifted so the player's chunk is in the middle again;
+        chunks that scroll out of the window are left to the world's cache.
+        """
+        tile_x, tile_y = self.player.tile()
+        center = WINDOW_CHUNKS // 2
+        shift_x = tile_x // CHUNK_SIZE - center
+        shift_y = tile_y // CHUNK_SIZE - center
+        if not shift_x and not shift_y:
+            return
+        self.origin = (self.origin[0] + shift_x, self.origin[1] + shift_y)
+        dx, dy = shift_x * CHUNK_SIZE * TILE_SIZE, shift_y * CHUNK_SIZE * TILE_SIZE
+        self._load_window()
+        self._index_chests()
+
+        # Keep everything in the new window's coordinates
+        window = pygame.Rect(0, 0, self.grid.width * TILE_SIZE, self.grid.height * TILE_SIZE)
+        for entity in [self.player] + self.monsters:
+            entity.x -= dx
+            entity.y -= dy
+            entity.rect.x = entity.x
+            entity.rect.y = entity.y
+        if self.swarm is not None:
+            self.swarm.x -= dx
+            self.swarm.y -= dy
+
+        # Monsters left behind in chunks that scrolled out respawn far away
+        stray = [monster for monster in self.monsters if not window.contains(monster.rect)]
+        for monster, (x, y) in zip(stray, self._spawn_positions(len(stray))):
+            monster.x, monster.y = x, y
+            monster.rect.topleft = (x, y)
+        if self.swarm is not None:
+            stray = np.flatnonzero((self.swarm.x < 0) | (self.swarm.y < 0) |
+                                   (self.swarm.x + self.swarm.width > window.width) |
+                                   (self.swarm.y + self.swarm.height > window.height))
+            for i, (x, y) in zip(stray, self._spawn_positions(len(stray))):
+                self.swarm.x[i], self.swarm.y[i] = x, y
+        self._index_monsters()
+
+        self._attach_pathfinding()
+        # Nothing is drawn sliding across the shift
+        self._remember_positions()
+        self.events.append((EVENT_WORLD_SHIFTED, (dx, dy)))
+
+    @property
+    def finished(self):
+        return self.game_over or self.win
+
+    def step(self, action=NO_ACTION):
+        """Advance the simulation by one TICK and return the events it produced"""
+        self.frame_count += 1
+        self.events = []
+
+        # Nothing moves once the game is over, so stop drawing between ticks
+        if self.finished:
+            self._remember_positions()
+            return self.events
+
+        player = self.player
+        self._remember_positions()
+
+        # Try to break a wall
+        if action.break_wall:
+            broken_wall_pos = player.break_wall(self.grid)
+            if broken_wall_pos:
+                if self.world is not None:
+                    self.world.break_wall(self.origin[0] * CHUNK_SIZE + broken_wall_pos[0] // TILE_SIZE,
+                                          self.origin[1] * CHUNK_SIZE + broken_wall_pos[1] // TILE_SIZE)
+                self.events.append((EVENT_WALL_BROKEN, broken_wall_pos))
+
+        # Update player (cooldowns, etc)
+        player.update(TICK)
+
+        # Handle player movement
+        player.move(action.dx * player.speed, action.dy * player.speed, self.grid)
+        if self.world is not None:
+            self._follow_player()
+        profiler.mark(PHASE_PLAYER)
+
+        # Move the monsters
+        if self.field is not None:
+            self.field.update(*player.tile())
+            profiler.mark(PHASE_PATHFINDING)
+        caught = False
+        for monster in self.monsters:
+            monster.move(player, self.grid, TICK, self.field)
+            caught = caught or monster.check_collision(player)
+        self._update_monster_index()
+        if self.swarm is not None:
+            self.swarm.move(self.field)
+            caught = caught or self.swarm.check_collision(player)
+        profiler.mark(PHASE_MONSTERS)
+
+        # Check if a monster caught the player
+        if caught:
+            self.game_over = True
+            player.is_alive = False
+            self.events.append((EVENT_CAUGHT, None))
+
+        # Check for chests on the tiles the player overlaps
+        rect, width = player.rect, self.grid.width
+        for y in range(rect.top // TILE_SIZE, (rect.bottom - 1) // TILE_SIZE + 1):
+            for x in range(rect.left // TILE_SIZE, (rect.right - 1) // TILE_SIZE + 1):
+                for chest in self.chest_index.get(y * width + x, ()):
+                    profiler.count(COUNT_COLLISIONS)
+                    if not chest.is_open and rect.colliderect(chest.rect):
+                        chest.open()
+                        self.chests_left -= 1
+                        player.gold += chest.gold
+                        if self.world is not None:
+                            self.world.open_chest(*chest.world_key)
+                        self.events.append((EVENT_CHEST_OPENED, chest))
+
+        # Check win condition (all chests opened); endless mode never ends
+        if self.world is None and not self.chests_left:
+            self.win = True
+            self.events.append((EVENT_WON, None))
+        profiler.mark(PHASE_CHESTS)
+
+        return self.events
+
+
+def action_from_keys(keys, break_wall=False):
+    """Translate pygame key states into an Action"""
+    dx, dy = 0, 0
+    if keys[pygame.K_LEFT]:
+        dx = -1
+    if keys[pygame.K_RIGHT]:
+        dx = 1
+    if keys[pygame.K_UP]:
+        dy = -1
+    if keys[pygame.K_DOWN]:
+        dy = 1
+    return Action(dx, dy, break_wall)
+
+
+class RandomPolicy:
+    """Wander in a random direction, occasionally trying to break a wall"""
+    def __init__(self, turn_every=20, break_chance=0.01, seed=None):
+        self.turn_every = turn_every
+        self.break_chance = break_chance
+        self.rng = random.Random(seed)
+        self.direction = (0, 0)
+
+    def __call__(self, game):
+        if game.frame_count % self.turn_every == 0:
+            self.direction = (self.rng.randint(-1, 1), self.rng.randint(-1, 1))
+        dx, dy = self.direction
+        return Action(dx, dy, self.rng.random() < self.break_chance)
+
+
+# Chest routes with at most this many stops are solved exactly; longer ones
+# greedily
+EXACT_ROUTE_LIMIT = 18
+
+
+def _shortest_tour(distance):
+    """Exact shortest walk from node 0 through every other node.
+
+    Bitmask dynamic program over a distance matrix: cost[mask, j] is the
+    shortest walk from node 0 through the stops in mask ending at stop j.
+    Masks are filled a popcount layer at a time, each layer with one NumPy
+    operation per end stop. Returns (order of stops, length).
+    """
+    stops = len(distance) - 1
+    between = distance[1:, 1:]
+    full = 1 << stops
+    cost = np.full((full, stops), INFINITY, dtype=np.int32)
+    ends = np.arange(stops)
+    cost[1 << ends, ends] = distance[0, 1:]
+    masks = np.arange(full)
+    popcount = np.zeros(full, dtype=np.int8)
+    for stop in range(stops):
+        popcount += ((masks >> stop) & 1).astype(np.int8)
+    for size in range(2, stops + 1):
+        layer = masks[popcount == size]
+        for stop in range(stops):
+            with_stop = layer[(layer >> stop) & 1 == 1]
+            cost[with_stop, stop] = (cost[with_stop ^ (1 << stop)] + between[:, stop]).min(axis=1)
+
+    # Walk back from the best last stop
+    mask = full - 1
+    last = int(cost[mask].argmin())
+    length = int(cost[mask, last])
+    order = [last]
+    while mask != 1 << last:
+        mask ^= 1 << last
+        last = int((cost[mask] + between[:, last]).argmin())
+        order.append(last)
+    order.reverse()
+    return [stop + 1 for stop in order], length
+
+
+def _greedy_tour(grid, start, targets):
+    """Walk to the nearest unvisited target each time; returns (order, length).
+
+    Each leg is a breadth-first search that stops at the first target it
+    reaches, so the whole tour costs about one search of the maze per few
+    targets rather than one per target. Every target must be reachable.
+    """
+    width, size, cells = grid.width, grid.width * grid.height, grid.cells
+    remaining = set(targets)
+    seen = array('i', [0]) * size
+    queue = array('i', bytes(4 * size))
+    distance = array('i', bytes(4 * size))
+    order, length, current = [], 0, start
+    for stamp in range(1, len(remaining) + 1):
+        seen[current] = stamp
+        queue[0] = current
+        distance[current] = 0
+        head, tail, found = 0, 1, None
+        while head < tail and found is None:
+            tile = queue[head]
+            head += 1
+            if tile in remaining:
+                found = tile
+                break
+            x = tile % width
+            for neighbor in (tile + 1 if x < width - 1 else -1,
+                             tile + width,
+                             tile - 1 if x > 0 else -1,
+                             tile - width):
+                if 0 <= neighbor < size and cells[neighbor] == 0 and seen[neighbor] != stamp:
+                    seen[neighbor] = stamp
+                    distance[neighbor] = distance[tile] + 1
+                    queue[tail] = neighbor
+                    tail += 1
+        profiler.count(COUNT_BFS_NODES, head)
+        if found is None:
+            break
+        remaining.discard(found)
+        order.append(found)
+        length += distance[found]
+        current = found
+    return order, length
+
+
+def solve_route(grid, start, targets):
+    """Order to visit target tiles from start in, walking as few tiles as possible.
+
+    Up to EXACT_ROUTE_LIMIT reachable targets the shortest route is found
+    exactly from BFS distances between the start and every target; beyond
+    that the nearest unvisited target is taken each time. Unreachable
+    targets are left out. Returns (tiles in order, length in tiles).
+    """
+    # Leave out unreachable targets first; searching for one would cover the
+    # whole reachable maze for nothing
+    bitboard = Bitboard(grid)
+    reachable = bitboard.flood_fill(start % grid.width, start // grid.width)
+    targets = list(dict.fromkeys(target for target in targets
+                                 if target != start and bitboard.contains(reachable, target)))
+    if not targets:
+        return [], 0
+    if len(targets) > EXACT_ROUTE_LIMIT:
+        return _greedy_tour(grid, start, targets)
+
+    # BFS distances between every pair of stops
+    stops = [start] + targets
+    field = DistanceField(grid)
+    distance = np.empty((len(stops), len(stops)), dtype=np.int32)
+    for row, stop in enumerate(stops):
+        field.update(stop % grid.width, stop // grid.width)
+        distance[row] = np.frombuffer(field.distance, dtype=np.int32)[stops]
+    order, length = _shortest_tour(distance)
+    return [stops[stop] for stop in order], length
+
+
+class RoutePolicy:
+    """Autoplay: walk the shortest route through every unopened chest.
+
+    The route is planned with solve_route() from the player's tile whenever
+    a new level appears, then followed from tile center to tile center. In
+    endless mode the route is kept in world tiles, so it carries on across
+    window shifts, and once it is walked the next one is planned in the
+    window the player has reached. Monsters are ignored and no walls are
+    broken.
+    """
+    def __init__(self):
+        self.grid = None
+        self.world = None
+        # Grid the current route was planned on
+        self.planned_grid = None
+        self.path = []
+        self.route_length = 0
+
+    @staticmethod
+    def offset(game):
+        """World tile of the top-left tile of the game's grid"""
+        if game.world is None:
+            return 0, 0
+        return game.origin[0] * CHUNK_SIZE, game.origin[1] * CHUNK_SIZE
+
+    def plan(self, game):
+        grid = self.planned_grid = game.grid
+        start = grid.index(*game.player.tile())
+        targets = sorted(tile for tile, chests in game.chest_index.items()
+                         if any(not chest.is_open for chest in chests))
+        order, self.route_length = solve_route(grid, start, targets)
+        legs = []
+        for tile in order:
+            legs.append(grid.find_path(start % grid.width, start // grid.width,
+                                       tile % grid.width, tile // grid.width))
+            start = tile
+        # World tiles to walk through, the next one last
+        offset_x, offset_y = self.offset(game)
+        self.path = [(tile % grid.width + offset_x, tile // grid.width + offset_y)
+                     for leg in reversed(legs) for tile in leg]
+
+    def __call__(self, game):
+        if game.grid is not self.grid:
+            # A shifted endless-mode window keeps the route being walked
+            if game.world is None or game.world is not self.world:
+                self.path = []
+            self.grid, self.world = game.grid, game.world
+        if not self.path and self.planned_grid is not self.grid:
+            self.plan(game)
+        player = game.player
+        offset_x, offset_y = self.offset(game)
+        while self.path:
+            x, y = self.path[-1]
+            target_x, target_y = self.grid.tile_center(self.grid.index(x - offset_x, y - offset_y))
+            dx = target_x - (player.x + player.width // 2)
+            dy = target_y - (player.y + player.height // 2)
+            if dx or dy:
+                return Action((dx > 0) - (dx < 0), (dy > 0) - (dy < 0))
+            self.path.pop()
+        return NO_ACTION
+
+
+class InputRecording:
+    """A session's seed and game options plus one byte of input per frame.
+
+    Each frame byte packs the action as (dx + 1) | (dy + 1) << 2 |
+    break_wall << 4; RESET_FRAME marks a restart before the next frame. The
+    file is a JSON header line followed by the raw frame bytes.
+    """
+    FORMAT_VERSION = 1
+    RESET_FRAME = 0xFF
+
+    def __init__(self, seed, game_options, frames=b"", final_state=None):
+        self.seed = seed
+        self.game_options = game_options
+        self.frames = bytearray(frames)
+        self.final_state = final_state
+
+    def record(self, action):
+        self.frames.append((action.dx + 1) | (action.dy + 1) << 2 | action.break_wall << 4)
+
+    def record_reset(self):
+        self.frames.append(self.RESET_FRAME)
+
+    @staticmethod
+    def decode(frame):
+        return Action((frame & 3) - 1, (frame >> 2 & 3) - 1, bool(frame & 16))
+
+    def save(self, path):
+        header = {
+            "version": self.FORMAT_VERSION,
+            "seed": self.seed,
+            "game_options": self.game_options,
+            "final_state": self.final_state,
+        }
+        with open(path, "wb") as f:
+            f.write(json.dumps(header).encode() + b"\n")
+            f.write(self.frames)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            frames = f.read()
+        if header["version"] != cls.FORMAT_VERSION:
+            raise ValueError(f"Unsupported recording version {header['version']}")
+        return cls(header["seed"], header["game_options"], frames, header["final_state"])
+
 
-def main():
-    # Create the level
-    player, walls, chests, monster = create_level()
+def game_state(game):
+    """Small summary of a game used to check that a replay matches its recording"""
+    return {
+        "frame": game.frame_count,
+        "player": [game.player.x, game.player.y],
+        "gold": game.player.gold,
+        "game_over": game.game_over,
+        "win": game.win,
+    }
+
+
+def replay(recording):
+    """Re-run a recorded session headless as fast as possible.
+
+    Returns timing stats, including the slowest tick so frame-time spikes
+    can be found again, and whether the final state matches the recording.
+    """
+    game = Game(seed=recording.seed, **recording.game_options)
+    tick_times = []
+    slowest_tick = None
+    for frame in recording.frames:
+        if frame == InputRecording.RESET_FRAME:
+            game.reset()
+            continue
+        action = InputRecording.decode(frame)
+        start = time.perf_counter()
+        game.step(action)
+        tick_times.append(time.perf_counter() - start)
+        if slowest_tick is None or tick_times[-1] > tick_times[slowest_tick]:
+            slowest_tick = len(tick_times) - 1
+    game.close()
+    elapsed = sum(tick_times)
+    ordered = sorted(tick_times) or [0.0]
+    return {
+        "ticks": len(tick_times),
+        "seconds": elapsed,
+        "ticks_per_second": len(tick_times) / elapsed if elapsed else float("inf"),
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p99_ms": ordered[min(len(ordered) - 1, len(ordered) * 99 // 100)] * 1000,
+        "slowest_tick": slowest_tick,
+        "slowest_ms": ordered[-1] * 1000,
+        "matches_recording": recording.final_state is None or game_state(game) == recording.final_state,
+    }
+
+
+def run_headless(ticks, policy=None, **game_options):
+    """Run the simulation for a number of ticks as fast as possible.
+
+    A new level is started whenever a game ends; game_options are passed to
+    Game. Returns a dict of stats.
+    """
+    if policy is None:
+        policy = RandomPolicy()
+    game = Game(**game_options)
+    levels, wins, deaths, gold = 1, 0, 0, 0
+    start = time.perf_counter()
+    for _ in range(ticks):
+        for kind, value in game.step(policy(game)):
+            if kind == EVENT_CHEST_OPENED:
+                gold += value.gold
+        if game.finished:
+            wins += game.win
+            deaths += game.game_over
+            game.reset()
+            levels += 1
+    elapsed = time.perf_counter() - start
+    game.close()
+    return {
+        "ticks": ticks,
+        "levels": levels,
+        "wins": wins,
+        "deaths": deaths,
+        "gold": gold,
+        # Gold collected per second of game time
+        "gold_per_second": gold / (ticks * TICK) if ticks else 0.0,
+        "seconds": elapsed,
+        "ticks_per_second": ticks / elapsed if elapsed else float("inf"),
+    }
+
+
+def entity_bytes(entity):
+    """Memory held by one entity: the object, its __dict__ if any, and its rect"""
+    size = sys.getsizeof(entity) + sys.getsizeof(entity.rect)
+    if hasattr(entity, "__dict__"):
+        size += sys.getsizeof(entity.__dict__)
+    return size
+
+
+def memory_report(**game_options):
+    """Bytes per entity and for the walls of a freshly built level.
+
+    Also times a full garbage collection, since every tracked object adds
+    to its traversal. game_options are passed to Game.
+    """
+    game = Game(**game_options)
+    game.close()
+    grid = game.grid
+    walls = grid.cells.count(1)
+    start = time.perf_counter()
+    gc.collect()
+    gc_seconds = time.perf_counter() - start
+    return {
+        "player_bytes": entity_bytes(game.player),
+        "chest_bytes": entity_bytes(game.chests[0]) if game.chests else 0,
+        "monster_bytes": entity_bytes(game.monsters[0]) if game.monsters else 0,
+        "walls": walls,
+        # One byte per tile of the grid, whether wall or not
+        "wall_bytes": sys.getsizeof(grid.cells),
+        "bytes_per_wall": sys.getsizeof(grid.cells) / walls if walls else 0.0,
+        "gc_objects": len(gc.get_objects()),
+        "gc_seconds": gc_seconds,
+    }
+
+
+class MazeLayer:
+    """Off-screen background holding the static maze.
+
+    Walls are painted once when the layer is built and the whole layer is
+    blitted each frame. Breaking a wall only repaints that one tile.
+    """
+    def __init__(self, grid):
+        self.grid = grid
+        self.surface = pygame.Surface((grid.width * TILE_SIZE, grid.height * TILE_SIZE))
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert()
+        self.surface.fill(BLACK)
+        tile = wall_tile()
+        walls = np.flatnonzero(np.frombuffer(grid.cells, dtype=np.uint8))
+        self.surface.blits([(tile, ((i % grid.width) * TILE_SIZE, (i // grid.width) * TILE_SIZE))
+                            for i in walls.tolist()], doreturn=False)
+
+    def repaint_tile(self, x, y):
+        """Redraw a single tile after it changed"""
+        tile = pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+        self.surface.fill(BLACK, tile)
+        if self.grid.is_wall(x, y):
+            paint_wall(self.surface, tile.x, tile.y)
+
+    def draw(self, screen):
+        profiler.count(COUNT_DRAW_CALLS)
+        screen.blit(self.surface, (0, 0))
+
+
+def draw_game(screen, font, game, maze_layer, particles=None):
+    """Render the current simulation state"""
+    player = game.player
+
+    # Draw the pre-baked walls
+    maze_layer.draw(screen)
+
+    # Draw effects
+    if particles is not None:
+        particles.draw(screen)
+
+    # Draw chests
+    for chest in game.chests:
+        chest.draw(screen)
+
+    # Draw monsters
+    for monster in game.monsters:
+        monster.draw(screen)
+    if game.swarm is not None:
+        game.swarm.draw(screen)
+
+    # Draw player if alive
+    if player.is_alive:
+        player.draw(screen)
+
+    draw_hud(screen, font, game)
+
+
+def draw_hud(screen, font, game):
+    """Draw the UI text and return the rects it covers"""
+    profiler.mark(PHASE_DRAW)
+    player = game.player
+    rects = []
+
+    # Draw UI
+    gold_text = font.render(f"Gold: {player.gold}", True, GOLD)
+    rects.append(screen.blit(gold_text, (10, 10)))
+
+    # Draw wall break ability info
+    if player.wall_break_cooldown > 0:
+        cooldown_text = font.render(f"Wall Break Cooldown: {math.ceil(player.wall_break_cooldown)}s", True, WHITE)
+        rects.append(screen.blit(cooldown_text, (10, 40)))
+    else:
+        if player.gold >= 10:
+            ability_text = font.render("Press SPACE to break a wall (Cost: 10 Gold)", True, GREEN)
+        else:
+            ability_text = font.render("Need 10 Gold to break walls", True, (150, 150, 150))
+        rects.append(screen.blit(ability_text, (10, 40)))
+
+    # Display messages based on game state
+    if game.game_over:
+        game_over_text = font.render("GAME OVER! The bank monster caught you!", True, RED)
+        restart_text = font.render("Press R to play again", True, WHITE)
+        rects.append(screen.blit(game_over_text, (SCREEN_WIDTH // 2 - 200, SCREEN_HEIGHT // 2 - 20)))
+        rects.append(screen.blit(restart_text, (SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2 + 20)))
+    elif game.win:
+        win_text = font.render(f"YOU WON! You collected {player.gold} gold!", True, GOLD)
+        restart_text = font.render("Press R to play again or ESC to exit", True, WHITE)
+        rects.append(screen.blit(win_text, (SCREEN_WIDTH // 2 - 200, SCREEN_HEIGHT // 2 - 20)))
+        rects.append(screen.blit(restart_text, (SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT // 2 + 20)))
+
+    if profiler.show_overlay:
+        rects.append(profiler.draw_overlay(screen))
+    profiler.count(COUNT_DRAW_CALLS, len(rects))
+    profiler.mark(PHASE_HUD)
+    return rects
+
+
+class DirtyRectRenderer:
+    """Render mode that only repaints and presents what changed.
+
+    Chests are static between pickups, so they are baked into a copy of the
+    maze background. Each frame the background is restored under last
+    frame's moving sprites (player, monster, break effect, HUD text), the
+    sprites are drawn again and only those rects are passed to
+    pygame.display.update().
+    """
+    def __init__(self, screen, font, maze_layer, chests):
+        self.screen = screen
+        self.font = font
+        self.maze_layer = maze_layer
+        self.chests = chests
+        self.background = maze_layer.surface.copy()
+        for chest in chests:
+            chest.draw(self.background)
+        self.sprite_rects = []
+        self.changed_rects = []
+        self.full_redraw = True
+
+    def _refresh(self, rect):
+        """Copy a changed part of the background to the screen"""
+        self.screen.blit(self.background, rect, rect)
+        self.changed_rects.append(rect)
+
+    def chest_opened(self, chest):
+        chest.draw(self.background)
+        self._refresh(chest.bounds())
+
+    def tile_changed(self, x, y):
+        """Pick up a tile the maze layer repainted, keeping chest lids on top"""
+        tile = pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+        self.background.blit(self.maze_layer.surface, tile, tile)
+        for chest in self.chests:
+            if chest.bounds().colliderect(tile):
+                chest.draw(self.background)
+        self._refresh(tile)
+
+    def render(self, game, particles=None):
+        screen = self.screen
+
+        # Restore the background under everything drawn last frame
+        if self.full_redraw:
+            screen.blit(self.background, (0, 0))
+        else:
+            for rect in self.sprite_rects:
+                screen.blit(self.background, rect, rect)
+        profiler.count(COUNT_DRAW_CALLS, 1 if self.full_redraw else len(self.sprite_rects))
+
+        # Draw the moving parts, remembering where they went
+        sprite_rects = []
+        if particles is not None:
+            area = particles.draw(screen)
+            if area:
+                sprite_rects.append(area)
+        for monster in game.monsters:
+            monster.draw(screen)
+            sprite_rects.append(monster.bounds())
+        if game.swarm is not None:
+            game.swarm.draw(screen)
+            sprite_rects.extend(game.swarm.bounds())
+        if game.player.is_alive:
+            game.player.draw(screen)
+            sprite_rects.append(game.player.bounds())
+        sprite_rects.extend(draw_hud(screen, self.font, game))
+
+        # Present only the areas that changed
+        if self.full_redraw:
+            pygame.display.flip()
+            self.full_redraw = False
+        else:
+            pygame.display.update(self.sprite_rects + self.changed_rects + sprite_rects)
+        self.sprite_rects = sprite_rects
+        self.changed_rects = []
+
+
+class Camera:
+    """Viewport onto a world larger than the screen, following the player"""
+    def __init__(self, width, height, world_width, world_height):
+        self.rect = pygame.Rect(0, 0, width, height)
+        self.world = pygame.Rect(0, 0, world_width, world_height)
+
+    @property
+    def offset(self):
+        return self.rect.topleft
+
+    def follow(self, target):
+        """Center on a rect, without showing anything past the world's edge"""
+        self.rect.center = target.center
+        self.rect.clamp_ip(self.world)
+
+    def tile_range(self, grid):
+        """Range of tile columns and rows intersecting the viewport"""
+        x0 = max(self.rect.left // TILE_SIZE, 0)
+        y0 = max(self.rect.top // TILE_SIZE, 0)
+        x1 = min((self.rect.right - 1) // TILE_SIZE, grid.width - 1)
+        y1 = min((self.rect.bottom - 1) // TILE_SIZE, grid.height - 1)
+        return range(x0, x1 + 1), range(y0, y1 + 1)
+
+
+class CameraRenderer:
+    """Render mode for worlds bigger than the screen.
+
+    Everything is drawn relative to a Camera that follows the player. Walls
+    are blitted from one pre-drawn tile, and chests and monsters are found
+    through the game's tile indexes, all only for the tiles inside the
+    viewport. Render cost depends on the screen size, not the world size
+    or the number of monsters.
+    """
+    def __init__(self, screen, font, grid):
+        self.screen = screen
+        self.font = font
+        self.camera = Camera(screen.get_width(), screen.get_height(),
+                             grid.width * TILE_SIZE, grid.height * TILE_SIZE)
+        self.wall_tile = wall_tile()
+
+    def render(self, game, particles=None):
+        screen, camera, grid = self.screen, self.camera, game.grid
+        camera.follow(game.player.rect)
+        offset_x, offset_y = offset = camera.offset
+        columns, rows = camera.tile_range(grid)
+
+        # Walls of the visible tiles
+        screen.fill(BLACK)
+        cells, width = grid.cells, grid.width
+        blits = [(self.wall_tile, (x * TILE_SIZE - offset_x, y * TILE_SIZE - offset_y))
+                 for y in rows for x in columns if cells[y * width + x]]
+        profiler.count(COUNT_DRAW_CALLS, len(blits))
+        screen.blits(blits, doreturn=False)
+
+        if particles is not None:
+            particles.draw(screen, offset)
+
+        # Chests of the visible tiles, plus the row below whose open lids
+        # reach up into view
+        for y in range(rows.start, min(rows.stop + 1, grid.height)):
+            for x in columns:
+                for chest in game.chest_index.get(y * width + x, ()):
+                    chest.draw(screen, offset)
+
+        # Monsters of the visible tiles, plus a tile all round since a
+        # monster's sprite reaches past the tile under its center
+        for y in range(max(rows.start - 1, 0), min(rows.stop + 1, grid.height)):
+            for x in range(max(columns.start - 1, 0), min(columns.stop + 1, width)):
+                for monster in game.monster_index.get(y * width + x, ()):
+                    monster.draw(screen, offset)
+        if game.swarm is not None:
+            game.swarm.draw(screen, offset)
+
+        if game.player.is_alive:
+            game.player.draw(screen, offset)
+
+        draw_hud(screen, self.font, game)
+        pygame.display.flip()
+
+
+class ParticleSystem:
+    """Fixed pool of short-lived particles for visual effects.
+
+    Position, velocity, lifetime and colour live in preallocated NumPy
+    arrays. Spawning writes a batch of slots round-robin, so when the pool
+    is full the oldest particles are recycled, and updating moves the whole
+    pool at once. Drawing blits cached circle images in one call. The cost
+    is bounded by the capacity however many effects overlap.
+
+    Effects draw from their own RNG, so they never disturb the simulation.
+    """
+    def __init__(self, capacity=MAX_PARTICLES, seed=None):
+        self.capacity = capacity
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        # Seconds left to live, out of the particle's full lifetime
+        self.life = np.zeros(capacity)
+        self.lifetime = np.ones(capacity)
+        self.size = np.zeros(capacity)
+        self.color = np.zeros((capacity, 3), dtype=np.uint8)
+        self.next_slot = 0
+        self.rng = np.random.default_rng(seed)
+        self.sprites = {}
+
+    def _slots(self, count):
+        # The next count slots, wrapping round; older particles there are replaced
+        count = min(count, self.capacity)
+        slots = (self.next_slot + np.arange(count)) % self.capacity
+        self.next_slot = (self.next_slot + count) % self.capacity
+        return slots
+
+    def burst(self, pos, count=BREAK_PARTICLES):
+        """Yellow sparks flying out of the tile whose top-left corner is pos"""
+        slots = self._slots(count)
+        count, rng = len(slots), self.rng
+        self.x[slots] = pos[0] + rng.uniform(0, TILE_SIZE, count)
+        self.y[slots] = pos[1] + rng.uniform(0, TILE_SIZE, count)
+        angle = rng.uniform(0, 2 * np.pi, count)
+        speed = rng.uniform(40, 160, count)
+        self.vx[slots] = np.cos(angle) * speed
+        self.vy[slots] = np.sin(angle) * speed
+        self.lifetime[slots] = rng.uniform(0.5, 1.0, count) * BREAK_EFFECT_DURATION
+        self.life[slots] = self.lifetime[slots]
+        self.size[slots] = rng.integers(3, 11, count)
+        # Few distinct shades so the circle images can be cached
+        shade = rng.integers(200, 256, count) // 8 * 8
+        self.color[slots] = np.stack([shade, shade, np.zeros(count, dtype=shade.dtype)], axis=1)
+
+    def update(self, dt):
+        """Move the particles on by dt seconds"""
+        self.x += self.vx * dt
+        self.y += self.vy * dt
+        np.subtract(self.life, dt, out=self.life)
+        np.maximum(self.life, 0, out=self.life)
+
+    def shift(self, dx, dy):
+        """Move every particle, when the world's coordinates move under them"""
+        self.x -= dx
+        self.y -= dy
+
+    def _sprite(self, radius, color):
+        key = (radius, color)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = pygame.Surface((radius * 2 + 1, radius * 2 + 1), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, color, (radius, radius), radius)
+            self.sprites[key] = sprite
+        return sprite
+
+    def draw(self, screen, offset=(0, 0)):
+        """Draw the live particles on screen; returns the area covered, or None"""
+        live = np.flatnonzero(self.life)
+        if not len(live):
+            return None
+        # Particles shrink as they age
+        radius = np.ceil(self.size[live] * self.life[live] / self.lifetime[live]).astype(np.int64)
+        left = np.floor(self.x[live] - offset[0]).astype(np.int64) - radius
+        top = np.floor(self.y[live] - offset[1]).astype(np.int64) - radius
+        right, bottom = left + 2 * radius + 1, top + 2 * radius + 1
+        screen_width, screen_height = screen.get_size()
+        visible = (right > 0) & (left < screen_width) & (bottom > 0) & (top < screen_height)
+        if not visible.any():
+            return None
+        left, top, right, bottom = left[visible], top[visible], right[visible], bottom[visible]
+        blits = [(self._sprite(r, tuple(color)), (x, y))
+                 for r, color, x, y in zip(radius[visible].tolist(), self.color[live[visible]].tolist(),
+                                           left.tolist(), top.tolist())]
+        profiler.count(COUNT_DRAW_CALLS, len(blits))
+        screen.blits(blits, doreturn=False)
+        x0, y0 = int(left.min()), int(top.min())
+        return pygame.Rect(x0, y0, int(right.max()) - x0, int(bottom.max()) - y0)
+
+
+def main(dirty_rects=False, record=None, profile=False, profile_out=None, fps=FPS, autoplay=False,
+         **game_options):
+    # Initialize pygame and set up the display
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Maze Treasure Hunter")
+    clock = pygame.time.Clock()
+
+    # Fonts
+    font = pygame.font.SysFont('Arial', 24)
+
+    # Create the simulation and its renderer
+    game = Game(interpolate=True, **game_options)
+    maze_layer = renderer = None
+    
+    # Autoplay walks the shortest chest route instead of reading the keys
+    policy = RoutePolicy() if autoplay else None
+    
+    # Effects are seeded from the game too, so a recorded session looks the same
+    particles = ParticleSystem(seed=game.seed)
     
-    # Frame counter
-    frame_count = 0
+    # Record the inputs, keeping the game's own seed in the recording
+    recording = None
+    if record:
+        recording = InputRecording(game.seed, {key: value for key, value in game_options.items()
+                                               if key != "seed"})
     
-    # Game state
-    game_over = False
-    win = False
+    def make_renderer():
+        # Worlds bigger than the screen scroll; otherwise the maze is pre-baked
+        if game.grid.width * TILE_SIZE > SCREEN_WIDTH or game.grid.height * TILE_SIZE > SCREEN_HEIGHT:
+            return None, CameraRenderer(screen, font, game.grid)
+        maze_layer = MazeLayer(game.grid)
+        if dirty_rects:
+            return maze_layer, DirtyRectRenderer(screen, font, maze_layer, game.chests)
+        return maze_layer, None
     
-    # Wall break effect
-    break_effect = None
-    break_effect_duration = 0
+    maze_layer, renderer = make_renderer()
+    grid = game.grid
+    
+    # Time the phases of every frame; F3 shows the overlay
+    if profile or profile_out:
+        profiler.enable()
+    
+    # Real time not yet simulated; the simulation runs in fixed TICK steps,
+    # as many per frame as the time that passed calls for
+    accumulator = 0.0
+    previous_time = time.perf_counter()
+    break_pressed = False
     
     # Main game loop
     running = True
     while running:
-        # Increment frame counter
-        frame_count += 1
-        
+        now = time.perf_counter()
+        frame_time = min(now - previous_time, MAX_FRAME_TIME)
+        previous_time = now
+        accumulator += frame_time
+
         # Handle events
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_r and (game_over or win):
+                if event.key == pygame.K_r and game.finished:
                     # Restart the game
-                    player, walls, chests, monster = create_level()
-                    frame_count = 0
-                    game_over = False
-                    win = False
-                elif event.key == pygame.K_SPACE and not game_over and not win:
-                    # Try to break a wall
-                    broken_wall_pos = player.break_wall(walls)
-                    if broken_wall_pos:
-                        break_effect = broken_wall_pos
-                        break_effect_duration = 15  # Show effect for 15 frames
+                    game.reset()
+                    if recording:
+                        recording.record_reset()
+                elif event.key == pygame.K_SPACE and not game.finished:
+                    # Try to break a wall on the next tick
+                    break_pressed = True
+                elif event.key == pygame.K_F3 and profiler.enabled:
+                    profiler.show_overlay = not profiler.show_overlay
         
         # Get key states
         keys = pygame.key.get_pressed()
+        profiler.mark(PHASE_EVENTS)
         
-        # Process game logic only if the game is not over
-        if not game_over and not win:
-            # Update player (cooldowns, etc)
-            player.update()
-            
-            # Handle player movement
-            dx, dy = 0, 0
-            if keys[pygame.K_LEFT]:
-                dx = -player.speed
-            if keys[pygame.K_RIGHT]:
-                dx = player.speed
-            if keys[pygame.K_UP]:
-                dy = -player.speed
-            if keys[pygame.K_DOWN]:
-                dy = player.speed
-            
-            player.move(dx, dy, walls)
-            
-            # Move the monster
-            monster.move(player, walls, frame_count)
-            
-            # Check if monster caught the player
-            if monster.check_collision(player):
-                game_over = True
-                player.is_alive = False
-            
-            # Check for chests
-            for chest in chests:
-                if not chest.is_open and player.rect.colliderect(chest.rect):
-                    chest.open()
-                    player.gold += chest.gold
-                    print(f"Found {chest.gold} gold! Total: {player.gold}")
-            
-            # Check win condition (all chests opened)
-            if all(chest.is_open for chest in chests):
-                win = True
+        # Advance the simulation
+        while accumulator >= TICK:
+            accumulator -= TICK
+            action = policy(game) if policy else action_from_keys(keys, break_pressed)
+            break_pressed = False
+            if recording:
+                recording.record(action)
+            for kind, value in game.step(action):
+                if kind == EVENT_CHEST_OPENED:
+                    print(f"Found {value.gold} gold! Total: {game.player.gold}")
+                    if isinstance(renderer, DirtyRectRenderer):
+                        renderer.chest_opened(value)
+                elif kind == EVENT_WALL_BROKEN:
+                    tile_x, tile_y = value[0] // TILE_SIZE, value[1] // TILE_SIZE
+                    if maze_layer:
+                        maze_layer.repaint_tile(tile_x, tile_y)
+                    if isinstance(renderer, DirtyRectRenderer):
+                        renderer.tile_changed(tile_x, tile_y)
+                    particles.burst(value)
+                elif kind == EVENT_WORLD_SHIFTED:
+                    particles.shift(*value)
+            profiler.mark(PHASE_EVENTS)
         
-        # Draw everything
-        screen.fill(BLACK)
-        
-        # Draw walls
-        for wall in walls:
-            wall.draw()
+        # Rebuild the renderer when a new level started
+        if grid is not game.grid:
+            maze_layer, renderer = make_renderer()
+            grid = game.grid
+        profiler.mark(PHASE_EVENTS)
         
-        # Draw break effect
-        if break_effect and break_effect_duration > 0:
-            # Create explosion-like particles
-            for _ in range(5):
-                x = break_effect[0] + random.randint(0, TILE_SIZE)
-                y = break_effect[1] + random.randint(0, TILE_SIZE)
-                size = random.randint(3, 10)
-                color_val = random.randint(200, 255)
-                color = (color_val, color_val, 0)  # Yellow-ish
-                pygame.draw.circle(screen, color, (x, y), size)
-            
-            break_effect_duration -= 1
-            if break_effect_duration <= 0:
-                break_effect = None
-        
-        # Draw chests
-        for chest in chests:
-            chest.draw()
-        
-        # Draw monster
-        monster.draw()
-        
-        # Draw player if alive
-        if player.is_alive:
-            player.draw()
-        
-        # Draw UI
-        gold_text = font.render(f"Gold: {player.gold}", True, GOLD)
-        screen.blit(gold_text, (10, 10))
-        
-        # Draw wall break ability info
-        if player.wall_break_cooldown > 0:
-            cooldown_text = font.render(f"Wall Break Cooldown: {player.wall_break_cooldown // 15 + 1}s", True, WHITE)
-            screen.blit(cooldown_text, (10, 40))
-        else:
-            if player.gold >= 10:
-                ability_text = font.render("Press SPACE to break a wall (Cost: 10 Gold)", True, GREEN)
+        # Draw everything, part way between the last two ticks
+        with game.interpolated(accumulator / TICK):
+            if renderer:
+                renderer.render(game, particles)
             else:
-                ability_text = font.render("Need 10 Gold to break walls", True, (150, 150, 150))
-            screen.blit(ability_text, (10, 40))
-        
-        # Display messages based on game state
-        if game_over:
-            game_over_text = font.render("GAME OVER! The bank monster caught you!", True, RED)
-            restart_text = font.render("Press R to play again", True, WHITE)
-            screen.blit(game_over_text, (SCREEN_WIDTH // 2 - 200, SCREEN_HEIGHT // 2 - 20))
-            screen.blit(restart_text, (SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2 + 20))
-        elif win:
-            win_text = font.render(f"YOU WON! You collected {player.gold} gold!", True, GOLD)
-            restart_text = font.render("Press R to play again or ESC to exit", True, WHITE)
-            screen.blit(win_text, (SCREEN_WIDTH // 2 - 200, SCREEN_HEIGHT // 2 - 20))
-            screen.blit(restart_text, (SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT // 2 + 20))
-            if keys[pygame.K_ESCAPE]:
-                running = False
+                draw_game(screen, font, game, maze_layer, particles)
+                pygame.display.flip()
+        profiler.mark(PHASE_FLIP)
         
-        # Update the display
-        pygame.display.flip()
+        # Effects run in real time, once per rendered frame
+        particles.update(frame_time)
+
+        if game.win and keys[pygame.K_ESCAPE]:
+            running = False
         
         # Cap the frame rate
-        clock.tick(60)
+        clock.tick(fps)
+        profiler.mark(PHASE_WAIT)
+        profiler.end_frame()
+    
+    if recording:
+        recording.final_state = game_state(game)
+        recording.save(record)
+    if profile_out:
+        profiler.export(profile_out)
     
+    game.close()
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Maze Treasure Hunter")
+    parser.add_argument("--headless", type=int, metavar="TICKS",
+                        help="run the simulation without a display for TICKS ticks and print stats")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="only repaint and present the parts of the screen that change")
+    parser.add_argument("--monsters", type=int, default=1, metavar="N",
+                        help="number of monsters; more than one share a distance field to the player")
+    parser.add_argument("--pathfinding", choices=[PATHFINDING_BFS, PATHFINDING_FIELD, PATHFINDING_DSTAR,
+                                                       PATHFINDING_BITBOARD],
+                        help="monster pathfinding mode (default: bfs for one monster, field for several)")
+    parser.add_argument("--swarm", action="store_true",
+                        help="stress mode: move all monsters as one NumPy-batched swarm")
+    parser.add_argument("--world-size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"),
+                        help="maze size in tiles; bigger than the screen scrolls with a camera")
+    parser.add_argument("--endless", action="store_true",
+                        help="explore an endless maze generated in chunks as you go")
+    parser.add_argument("--world-seed", type=int, metavar="SEED",
+                        help="seed for the endless maze")
+    parser.add_argument("--seed", type=int, help="seed for level generation")
+    parser.add_argument("--record", metavar="FILE", help="record the session's inputs to FILE")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="re-run a recorded session headless as fast as possible and print stats")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each phase of the frame; F3 toggles an overlay with p50/p99")
+    parser.add_argument("--profile-out", metavar="FILE",
+                        help="profile and write every frame's timings and counts to a .csv or .json file at exit")
+    parser.add_argument("--fps", type=int, default=FPS, metavar="N",
+                        help=f"cap on rendered frames per second (default {FPS}, 0 for no cap); "
+                             f"the simulation always runs at {TICK_RATE} ticks per second")
+    parser.add_argument("--autoplay", action="store_true",
+                        help="let the player walk the shortest route through every chest")
+    parser.add_argument("--prefetch", type=int, default=2, metavar="N",
+                        help="levels to keep generated ahead in the background (0 to disable)")
+    parser.add_argument("--memory", action="store_true",
+                        help="print the bytes used per entity and by the walls of one level")
+    parser.add_argument("--levels", metavar="FILE",
+                        help="play the levels of a level library in order instead of generating them")
+    parser.add_argument("--save-levels", nargs=2, metavar=("FILE", "COUNT"),
+                        help="generate COUNT levels from --seed into a level library FILE and exit")
+    args = parser.parse_args()
+    game_options = dict(monster_count=args.monsters, pathfinding=args.pathfinding,
+                        swarm=args.swarm, world_size=args.world_size,
+                        endless=args.endless, world_seed=args.world_seed, seed=args.seed,
+                        prefetch=args.prefetch, levels=args.levels)
+    if args.save_levels:
+        print(make_level_library(args.save_levels[0], int(args.save_levels[1]), args.seed,
+                                 args.monsters, args.world_size))
+    elif args.replay:
+        print(replay(InputRecording.load(args.replay)))
+    elif args.memory:
+        print(memory_report(**game_options))
+    elif args.headless:
+        print(run_headless(args.headless, RoutePolicy() if args.autoplay else None, **game_options))
+    else:
+        main(dirty_rects=args.dirty_rects, record=args.record, profile=args.profile,
+             profile_out=args.profile_out, fps=args.fps, autoplay=args.autoplay, **game_options)
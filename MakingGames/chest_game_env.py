@@ -0,0 +1,202 @@
+# /// script
+# requires-python = ">=3.12"
+# dependencies = [
+#     "numpy",
+#     "pygame",
+# ]
+# ///
+
+"""Vectorised reinforcement-learning environment for the chest game.
+
+Runs N independent Game simulations side by side with a gym-style
+reset()/step(actions) API. Nothing here touches pygame.display; only
+pygame.Rect is used, through the game rules.
+"""
+
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import chest_game_claude37 as chest_game
+
+# Discrete actions: every (dx, dy) step, without and then with breaking a wall
+ACTIONS = [chest_game.Action(dx, dy, break_wall)
+           for break_wall in (False, True) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+
+# Observation planes, one tile grid each
+PLANE_WALLS = 0
+PLANE_CHESTS = 1  # unopened chests
+PLANE_PLAYER = 2
+PLANE_MONSTERS = 3  # number of monsters on the tile, capped at 255
+PLANES = 4
+
+# Reward for being caught; collecting a chest is worth its gold
+CAUGHT_REWARD = -50.0
+
+
+def check_game_options(game_options):
+    """Reject game options whose mazes don't have the size world_size gives"""
+    for option in ("endless", "levels"):
+        if game_options.get(option):
+            raise ValueError(f"The {option} game option is not supported: observations are "
+                             f"sized from world_size")
+
+
+def observation_shape(world_size=None):
+    """Shape of one game's observation"""
+    width, height = world_size or (chest_game.SCREEN_WIDTH // chest_game.TILE_SIZE,
+                                   chest_game.SCREEN_HEIGHT // chest_game.TILE_SIZE)
+    return (PLANES, height, width)
+
+
+def observe(game, out):
+    """Write every plane of a game's observation into out"""
+    out[PLANE_CHESTS] = 0
+    for tile, chests in game.chest_index.items():
+        if any(not chest.is_open for chest in chests):
+            out[PLANE_CHESTS].flat[tile] = 1
+    observe_moving(game, out)
+
+
+def observe_moving(game, out):
+    """Write the planes that change during a level: walls, player and monsters"""
+    grid = game.grid
+    out[PLANE_WALLS].flat[:] = np.frombuffer(grid.cells, dtype=np.uint8)
+    out[PLANE_PLAYER] = 0
+    x, y = game.player.tile()
+    out[PLANE_PLAYER, y, x] = 1
+    monsters = out[PLANE_MONSTERS]
+    monsters[:] = 0
+    for monster in game.monsters:
+        tile = monster.center_tile(grid)
+        monsters.flat[tile] = min(monsters.flat[tile] + 1, 255)
+    swarm = game.swarm
+    if swarm is not None and len(swarm):
+        tiles = (((swarm.y + swarm.height / 2) // chest_game.TILE_SIZE).astype(np.int64) * grid.width +
+                 ((swarm.x + swarm.width / 2) // chest_game.TILE_SIZE).astype(np.int64))
+        counts = np.bincount(tiles, minlength=grid.width * grid.height) + monsters.ravel()
+        monsters.flat[:] = np.minimum(counts, 255)
+
+
+class ChestGameVecEnv:
+    """N chest games stepped together.
+
+    Observations are uint8 arrays of shape (N, PLANES, height, width) with
+    one tile grid per plane. Actions are indices into ACTIONS. A game whose
+    episode ends (caught, won or max_steps reached) starts a new level
+    straight away; the observation returned for it is the new level's
+    first one, and infos describe the episode that just ended.
+    """
+    def __init__(self, num_envs, max_steps=3000, caught_reward=CAUGHT_REWARD, **game_options):
+        check_game_options(game_options)
+        self.num_envs = num_envs
+        self.max_steps = max_steps
+        self.caught_reward = caught_reward
+        self.game_options = game_options
+        self.games = []
+        self.observation_shape = observation_shape(game_options.get("world_size"))
+        self.action_count = len(ACTIONS)
+        self.observations = np.zeros((num_envs,) + self.observation_shape, dtype=np.uint8)
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+        self.episode_gold = np.zeros(num_envs, dtype=np.int64)
+
+    def reset(self, seed=None):
+        """Start a new game in every environment; returns the observations"""
+        rng = random.Random(seed)
+        self.close()
+        self.games = [chest_game.Game(seed=rng.getrandbits(64), **self.game_options)
+                      for _ in range(self.num_envs)]
+        for i in range(self.num_envs):
+            self._start_episode(i)
+        return self.observations.copy()
+
+    def close(self):
+        """Stop any background level generation of the current games"""
+        for game in self.games:
+            game.close()
+
+    def _start_episode(self, i):
+        observe(self.games[i], self.observations[i])
+        self.steps[i] = 0
+        self.episode_gold[i] = 0
+
+    def step(self, actions):
+        """Apply one action per environment.
+
+        Returns (observations, rewards, terminated, truncated, infos), where
+        terminated means caught or won and truncated means max_steps ran
+        out. infos holds arrays over the environments: "won", and the
+        "episode_gold" and "episode_length" of episodes that just ended
+        (zero elsewhere).
+        """
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        terminated = np.zeros(self.num_envs, dtype=bool)
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        won = np.zeros(self.num_envs, dtype=bool)
+        episode_gold = np.zeros(self.num_envs, dtype=np.int64)
+        episode_length = np.zeros(self.num_envs, dtype=np.int64)
+        chests = self.observations[:, PLANE_CHESTS]
+
+        for i, (game, action) in enumerate(zip(self.games, np.asarray(actions).tolist())):
+            for kind, value in game.step(ACTIONS[action]):
+                if kind == chest_game.EVENT_CHEST_OPENED:
+                    rewards[i] += value.gold
+                    self.episode_gold[i] += value.gold
+                    chests[i].flat[game.grid.index(value.rect.centerx // chest_game.TILE_SIZE,
+                                                   value.rect.centery // chest_game.TILE_SIZE)] = 0
+                elif kind == chest_game.EVENT_CAUGHT:
+                    rewards[i] += self.caught_reward
+            self.steps[i] += 1
+            terminated[i] = game.finished
+            truncated[i] = not game.finished and self.steps[i] >= self.max_steps
+            if terminated[i] or truncated[i]:
+                won[i] = game.win
+                episode_gold[i] = self.episode_gold[i]
+                episode_length[i] = self.steps[i]
+                game.reset()
+                self._start_episode(i)
+            else:
+                # Chests are cleared as they are opened, the rest is redrawn
+                observe_moving(game, self.observations[i])
+
+        infos = {"won": won, "episode_gold": episode_gold, "episode_length": episode_length}
+        return self.observations.copy(), rewards, terminated, truncated, infos
+
+
+def benchmark(num_envs, steps, seed=None, **game_options):
+    """Step the environment with random actions and report throughput"""
+    env = ChestGameVecEnv(num_envs, **game_options)
+    env.reset(seed)
+    rng = np.random.default_rng(seed)
+    episodes = gold = 0
+    start = time.perf_counter()
+    for _ in range(steps):
+        _, _, terminated, truncated, infos = env.step(rng.integers(env.action_count, size=num_envs))
+        done = terminated | truncated
+        episodes += int(done.sum())
+        gold += int(infos["episode_gold"].sum())
+    elapsed = time.perf_counter() - start
+    env.close()
+    return {
+        "env_steps": num_envs * steps,
+        "episodes": episodes,
+        "mean_episode_gold": gold / episodes if episodes else 0.0,
+        "seconds": elapsed,
+        "steps_per_second": num_envs * steps / elapsed if elapsed else float("inf"),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the vectorised chest game environment")
+    parser.add_argument("--envs", type=int, default=64, metavar="N", help="games stepped together")
+    parser.add_argument("--steps", type=int, default=1000, help="vector steps to run")
+    parser.add_argument("--monsters", type=int, default=1, metavar="N")
+    parser.add_argument("--world-size", type=int, nargs=2, metavar=("W", "H"))
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    print(benchmark(args.envs, args.steps, args.seed, monster_count=args.monsters,
+                    world_size=args.world_size))
@@ -0,0 +1,143 @@
+# /// script
+# requires-python = ">=3.12"
+# dependencies = [
+#     "numpy",
+#     "pygame",
+# ]
+# ///
+
+"""Run many headless chest game episodes across worker processes.
+
+Each worker plays its share of episodes with the game's own rules and
+writes one result row and the final observation of every episode straight
+into shared memory, so the parent collects everything without pickling.
+"""
+
+import argparse
+import os
+import random
+import time
+from multiprocessing import Process, shared_memory
+
+import numpy as np
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import chest_game_claude37 as chest_game
+from chest_game_env import check_game_options, observation_shape, observe
+
+# Columns of the per-episode results array
+RESULT_COLUMNS = ("worker", "gold", "length", "won", "caught", "chests_opened", "walls_broken")
+(COLUMN_WORKER, COLUMN_GOLD, COLUMN_LENGTH, COLUMN_WON, COLUMN_CAUGHT,
+ COLUMN_CHESTS_OPENED, COLUMN_WALLS_BROKEN) = range(len(RESULT_COLUMNS))
+
+
+def _attach(name, shape, dtype):
+    # The shared block and an array viewing it; keep the block alive while the array is used
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def _worker(index, episodes, seed, max_steps, game_options, results_name, observations_name, obs_shape):
+    """Play episodes and fill this worker's rows of the shared arrays"""
+    first, end = episodes * index, episodes * (index + 1)
+    results_block, results = _attach(results_name, (end, len(RESULT_COLUMNS)), np.int64)
+    observations_block, observations = _attach(observations_name, (end,) + obs_shape, np.uint8)
+    game = chest_game.Game(seed=seed, **game_options)
+    policy = chest_game.RandomPolicy(seed=seed)
+    for row in range(first, end):
+        chests_opened = walls_broken = steps = 0
+        while not game.finished and steps < max_steps:
+            for kind, _ in game.step(policy(game)):
+                if kind == chest_game.EVENT_CHEST_OPENED:
+                    chests_opened += 1
+                elif kind == chest_game.EVENT_WALL_BROKEN:
+                    walls_broken += 1
+            steps += 1
+        results[row] = (index, game.player.gold, steps, game.win, game.game_over,
+                        chests_opened, walls_broken)
+        observe(game, observations[row])
+        game.reset()
+    game.close()
+    del results, observations
+    results_block.close()
+    observations_block.close()
+
+
+def run_rollouts(workers=None, episodes_per_worker=100, max_steps=3000, seed=None, **game_options):
+    """Play workers * episodes_per_worker episodes in parallel.
+
+    Returns a dict of aggregate stats, plus "results" (one row of
+    RESULT_COLUMNS per episode) and "final_observations" (the observation
+    at the end of every episode, as in chest_game_env).
+    """
+    check_game_options(game_options)
+    workers = workers or os.cpu_count()
+    total = workers * episodes_per_worker
+    obs_shape = observation_shape(game_options.get("world_size"))
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(64) for _ in range(workers)]
+
+    results_size = total * len(RESULT_COLUMNS) * np.dtype(np.int64).itemsize
+    observations_size = total * int(np.prod(obs_shape))
+    results_block = shared_memory.SharedMemory(create=True, size=max(results_size, 1))
+    observations_block = shared_memory.SharedMemory(create=True, size=max(observations_size, 1))
+    try:
+        start = time.perf_counter()
+        processes = [Process(target=_worker,
+                             args=(i, episodes_per_worker, seeds[i], max_steps, game_options,
+                                   results_block.name, observations_block.name, obs_shape))
+                     for i in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+        failed = [i for i, process in enumerate(processes) if process.exitcode != 0]
+        if failed:
+            raise RuntimeError(f"rollout workers {failed} failed")
+
+        # Copy out so the shared blocks can be released
+        results = np.ndarray((total, len(RESULT_COLUMNS)), dtype=np.int64, buffer=results_block.buf).copy()
+        final_observations = np.ndarray((total,) + obs_shape, dtype=np.uint8,
+                                        buffer=observations_block.buf).copy()
+    finally:
+        results_block.close()
+        results_block.unlink()
+        observations_block.close()
+        observations_block.unlink()
+
+    steps = int(results[:, COLUMN_LENGTH].sum())
+    return {
+        "workers": workers,
+        "episodes": total,
+        "steps": steps,
+        "wins": int(results[:, COLUMN_WON].sum()),
+        "deaths": int(results[:, COLUMN_CAUGHT].sum()),
+        "mean_gold": float(results[:, COLUMN_GOLD].mean()) if total else 0.0,
+        "mean_length": float(results[:, COLUMN_LENGTH].mean()) if total else 0.0,
+        "seconds": elapsed,
+        "steps_per_second": steps / elapsed if elapsed else float("inf"),
+        "results": results,
+        "final_observations": final_observations,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run chest game episodes in parallel worker processes")
+    parser.add_argument("--workers", type=int, metavar="N", help="worker processes (default: one per core)")
+    parser.add_argument("--episodes", type=int, default=100, metavar="N", help="episodes per worker")
+    parser.add_argument("--max-steps", type=int, default=3000, metavar="N",
+                        help="steps before an episode is cut short")
+    parser.add_argument("--monsters", type=int, default=1, metavar="N")
+    parser.add_argument("--world-size", type=int, nargs=2, metavar=("W", "H"))
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--save", metavar="FILE", help="write the results and final observations to a .npz file")
+    args = parser.parse_args()
+    stats = run_rollouts(args.workers, args.episodes, args.max_steps, args.seed,
+                         monster_count=args.monsters, world_size=args.world_size)
+    results = stats.pop("results")
+    final_observations = stats.pop("final_observations")
+    if args.save:
+        np.savez_compressed(args.save, results=results, columns=np.array(RESULT_COLUMNS),
+                            final_observations=final_observations)
+    print(stats)